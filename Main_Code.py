@@ -1,21 +1,19 @@
 import time
 import numpy as np
-import board
-import neopixel
-import RPi.GPIO as GPIO
-from datetime import datetime
-import adi
+from datetime import datetime, timezone
 
-# --- LED Setup ---
+from capture import CaptureThread, SampleRing
+from hardware import LedStrip, RockerSwitch
+from kml_writer import KmlWriter
+from metrics import Metrics
+from preamble import CarrierDetector
+from sources import open_source
+
+# --- LED Setup (GPIO18; disabled where neopixel is unavailable) ---
 LED_COUNT = 7
-LED_PIN = board.D18
 LED_BRIGHTNESS = 0.2
-LED_ORDER = neopixel.GRB
 
-pixels = neopixel.NeoPixel(
-    LED_PIN, LED_COUNT, brightness=LED_BRIGHTNESS,
-    auto_write=False, pixel_order=LED_ORDER
-)
+pixels = LedStrip(LED_COUNT, LED_BRIGHTNESS)
 
 def flash_alert(color, flashes=3, delay=0.2):
     for _ in range(flashes):
@@ -28,8 +26,7 @@ def flash_alert(color, flashes=3, delay=0.2):
 
 # --- GPIO Setup for Rocker Switch ---
 SWITCH_PIN = 17
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(SWITCH_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+switch = RockerSwitch(SWITCH_PIN)
 
 running = False
 
@@ -39,39 +36,64 @@ def toggle_execution(channel):
     state = "STARTED" if running else "STOPPED"
     print(f"System {state}")
 
-GPIO.add_event_detect(SWITCH_PIN, GPIO.FALLING, callback=toggle_execution, bouncetime=500)
+switch.on_toggle(toggle_execution, bouncetime=500)
 
 # --- SDR Setup (Pluto+) ---
-sdr = adi.Pluto(uri="ip:192.168.2.1")
-sdr.rx_lo = int(406.025e6)
-sdr.sample_rate = int(1e6)
-sdr.rx_rf_bandwidth = int(200e3)
-sdr.gain_control_mode = "slow_attack"
-sdr.rx_buffer_size = 4096
-
-# --- KML File Setup ---
-kml_file = "beacon_locations.kml"
-with open(kml_file, 'w') as f:
-    f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
-    f.write('<kml xmlns="http://www.opengis.net/kml/2.2">\n<Document>\n')
-
-def append_kml(lat, lon, hex_id):
-    with open(kml_file, 'a') as f:
-        placemark = (
-            f"<Placemark><name>Beacon - {hex_id}</name>"
-            f"<Point><coordinates>{lon},{lat},0</coordinates></Point>"
-            "</Placemark>\n"
-        )
-        f.write(placemark)
+sdr = open_source(  # SAFET_SOURCE=sim, or the path of a recording, runs without the Pluto
+    sample_rate=1e6,
+    rx_lo=406.025e6,
+    rf_bandwidth=200e3,
+    buffer_size=4096,
+    gain_control_mode="slow_attack",
+)
+
+# --- Carrier Detector (wakes on the 160 ms burst preamble) ---
+detector = CarrierDetector(sdr.sample_rate)
+
+# --- Capture Ring (4 s of samples, filled by a thread while running) ---
+ring = SampleRing(4 * sdr.sample_rate)
+capture = None
+
+# --- Metrics (SAFET_METRICS_PORT / SAFET_METRICS_JSON export them) ---
+metrics = Metrics()
+metrics.export_from_env()
+
+# --- KML File Setup (valid after every write, one track per beacon) ---
+kml = KmlWriter("beacon_locations.kml")
+
+def append_kml(lat, lon, hex_id, country_code, encoded_location):
+    kml.write([{
+        "hex_id": hex_id,
+        "country_code": country_code,
+        "location_hex": encoded_location,
+        "latitude": lat,
+        "longitude": lon,
+        "time": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+    }])
 
 # --- Main Loop ---
 try:
     print("Waiting for switch to start...")
     while True:
         if running:
-            samples = sdr.rx()
-            signal = np.real(samples)
-            if np.max(np.abs(signal)) > 0.5:
+            if capture is None:
+                # Samples left from the last run would be decoded as if they were new
+                ring.clear()
+                detector.reset()
+                capture = CaptureThread(sdr, ring, metrics)
+                capture.start()
+            if capture.error is not None:
+                print(f"Capture error, restarting: {capture.error}")
+                metrics.count("capture_errors")
+                capture = None
+                time.sleep(0.5)
+                continue
+            samples = ring.read(16 * sdr.rx_buffer_size, timeout=0.5)
+            if len(samples) == 0:
+                continue
+            metrics.count("reads")
+            if detector.push(samples) is not None:
+                metrics.count("bursts")
                 print("406 MHz Beacon Detected!")
 
                 # Dummy hex packet simulation
@@ -93,19 +115,22 @@ try:
                 print(f"Latitude (Decoded): {lat}")
                 print(f"Longitude (Decoded): {lon}")
 
-                append_kml(lat, lon, beacon_hex_id)
+                append_kml(lat, lon, beacon_hex_id, country_code, encoded_location)
                 flash_alert((0, 255, 0), flashes=5)
-
-            else:
-                print("No 406 MHz Beacon Signal")
-            time.sleep(0.5)
         else:
+            if capture is not None:
+                capture.stop()
+                print(f"Capture stopped: {capture.stats()}")
+                print(metrics.summary())
+                capture = None
             time.sleep(0.2)
 
 except KeyboardInterrupt:
     print("\nShutting down...")
-    with open(kml_file, 'a') as f:
-        f.write('</Document></kml>\n')
+    if capture is not None:
+        capture.stop()
+    print(metrics.summary())
+    kml.close()
     pixels.fill((0, 0, 0))
     pixels.show()
-    GPIO.cleanup()
+    switch.cleanup()
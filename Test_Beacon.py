@@ -1,109 +1,115 @@
-import adi
 import numpy as np
 import time
 import math
 from datetime import datetime
-from commpy.filters import rcosfilter
+from functools import lru_cache
+
+from beacon_frame import BeaconFrame, pack_fields
+from bch import BCH1, BCH2, bits_to_int, int_to_bits
+from filterbank import cached_rcosfilter, convolve
 
 def calculateBCH(data):
 
     if(len(data) == 26):
-        g = np.array([1,0,1,0,1,0,0,1,1,1,0,0,1])
-        data = np.append(data,np.repeat(0,12))
+        code = BCH2
     elif(len(data) == 61):
-        g = np.array([1,0,0,1,1,0,1,1,0,1,1,0,0,1,1,1,1,0,0,0,1,1])
-        data = np.append(data,np.repeat(0,21))
+        code = BCH1
     else:
         raise ValueError("Data must be either 26 bits or 61 bits long, but data is " + str(len(data)) + " bits long")
 
-    while np.where(data==1)[0][0] + len(g) <= len(data):
-        index = np.where(data==1)[0][0]
-        data[index:index+len(g)] = data[index:index+len(g)]^g
-
-    if(len(data) == 38):
-        bchCode = data[-12:]
-    elif(len(data) == 82):
-        bchCode = data[-21:]
-
-    return bchCode
+    return int_to_bits(code.encode(bits_to_int(data)), code.parity_bits)
 
 sign = lambda x: math.copysign(1, x)
 
-def dec2bin(n,minBits = 0):
-    n = int(n)
-    stringBinary = bin(n)[2:]
-    binaryValue = []
-
-    for i in range(0,len(stringBinary)):
-        binaryValue.append(int(stringBinary[i]))
-
-    if(minBits != 0):
-        binaryValue = np.append(np.repeat(0,minBits - len(binaryValue)),binaryValue)
-                           
-    return binaryValue
-
-def createPacket(gps):
-    #HEX ID: 2E1C010002FFBFF
-    bitSynch = np.array([1,1,1,1,1,1,1,1,1,1,1,1,1,1,1])
-    frameSynch = np.array([0,0,0,1,0,1,1,1,1])
-    formatFlag = np.array([1])
-    protocolFlag = np.array([0])
-    countryCode = np.array([0,1,0,1,1,1,0,0,0,0])
-    protocolCode = np.array([1,1,1,0])
-    encodedPositionSource = np.array([1])
-    testProtocol = np.array([0,0,0,0,0,0,0,0,1,0,0,0,0,0,0,0,0,0,0,0,0,0,0,1])
-    packet = np.concatenate([bitSynch,frameSynch,formatFlag,protocolFlag,countryCode,protocolCode,testProtocol])
-
-    if(gps.latitude > 0):
-        packet = np.concatenate([packet, np.array([0])])
-    else:
-        packet = np.concatenate([packet, np.array([1])])
+def createPacket(gps, countryCode=0b0101110000, testProtocol=0b000000001000000000000001):
+    #HEX ID: 2E1C010002FFBFF with the default country code and test protocol data
+    bitSynch = 0b111111111111111
+    frameSynch = 0b000101111
+    formatFlag = 1
+    protocolFlag = 0
+    protocolCode = 0b1110
+    encodedPositionSource = 1
+
+    pdf1 = pack_fields([
+        (formatFlag, 1), (protocolFlag, 1), (countryCode, 10), (protocolCode, 4), (testProtocol, 24),
+        (0 if gps.latitude > 0 else 1, 1), (round(abs(gps.latitude)/0.25), 9),
+        (0 if gps.longitude > 0 else 1, 1), (round(abs(gps.longitude)/0.25), 10),
+    ])
 
-    packet = np.concatenate([packet, dec2bin(round(abs(gps.latitude)/0.25),9)])
-    
-    if(gps.longitude > 0):
-        packet = np.concatenate([packet, np.array([0])])
-    else:
-        packet = np.concatenate([packet, np.array([1])])
-
-    packet = np.concatenate([packet, dec2bin(round(abs(gps.longitude)/0.25),10)])
-
-    #Add first error detection block
-    packet = np.concatenate([packet,calculateBCH(packet[24:85]), np.array([1,1,0,1]), encodedPositionSource, np.array([0])])
-    
     #Calculate positional offsets
     latitudeOffset = abs(gps.latitude) - round(abs(gps.latitude)/0.25)*0.25
-    packet = np.concatenate([packet, np.array([int(max(sign(latitudeOffset),0))]) ])
+    latitudeSign = int(max(sign(latitudeOffset),0))
     latitudeOffset = abs(latitudeOffset)
-    packet = np.concatenate([packet, dec2bin(math.floor(60*latitudeOffset),5), dec2bin(round(60*((60*latitudeOffset)%1)/4),4)])
 
     longitudeOffset = abs(gps.longitude) - round(abs(gps.longitude)/0.25)*0.25
-    packet = np.concatenate([packet, np.array([int(max(sign(longitudeOffset),0))]) ])
+    longitudeSign = int(max(sign(longitudeOffset),0))
     longitudeOffset = abs(longitudeOffset)
-    packet = np.concatenate([packet, dec2bin(math.floor(60*longitudeOffset),5), dec2bin(round(60*((60*longitudeOffset)%1))/4,4)])
 
-    #Add second error detection block
-    packet = np.concatenate([packet, calculateBCH(packet[106:132])])
-
-    return packet
+    pdf2 = pack_fields([
+        (0b1101, 4), (encodedPositionSource, 1), (0, 1),
+        (latitudeSign, 1), (math.floor(60*latitudeOffset), 5), (round(60*((60*latitudeOffset)%1)/4), 4),
+        (longitudeSign, 1), (math.floor(60*longitudeOffset), 5), (int(round(60*((60*longitudeOffset)%1))/4), 4),
+    ])
+
+    #Add both error detection blocks
+    frame = BeaconFrame(pack_fields([
+        (bitSynch, 15), (frameSynch, 9),
+        (pdf1, 61), (BCH1.encode(pdf1), 21),
+        (pdf2, 26), (BCH2.encode(pdf2), 12),
+    ]))
+
+    return frame.to_bits()
+
+PHASE_DEVIATION = 1.1  # radians
+PREAMBLE_SECONDS = 0.160
+
+@lru_cache(maxsize=8)
+def cachedPreamble(numSamples):
+    """
+    Unmodulated carrier ahead of the data, scaled for sdr.tx(). Read-only
+    because every waveform shares it.
+    """
+    preamble = np.full(numSamples, 2**14, dtype=np.complex128)
+    preamble.flags.writeable = False
+    return preamble
+
+def buildWaveform(packet,dataRate,samplesPerBit):
+    """
+    Biphase-L phase modulation of the packet, built without a per-bit
+    loop: each bit becomes two +/-1.1 rad half-bit chips, expanded to
+    samples with one np.repeat, and filtered by the raised cosine scaled
+    to unit gain so the data matches the preamble amplitude.
+    """
+    symbols = 2*np.asarray(packet, dtype=np.float64) - 1
+    chips = np.exp(1j*PHASE_DEVIATION*np.stack([symbols, -symbols], axis=1).ravel())
+    # Half-bit boundaries rounded to whole samples, exact when samplesPerBit is even
+    edges = np.rint(np.arange(len(chips) + 1)*samplesPerBit/2).astype(np.int64)
+    counts = np.diff(edges)
+
+    filt = cached_rcosfilter(132,0.8,dataRate,dataRate*samplesPerBit)
+    filt = filt/filt.sum()
+    ramp = len(filt) - 1
+    if counts.min() < ramp:
+        data = convolve(np.repeat(chips, counts), filt)
+    else:
+        # The filtered chips are constant except for the filter's step
+        # response across each boundary (including the start and end of
+        # the burst); chips longer than the filter keep these apart, so
+        # this equals the full convolution.
+        data = np.repeat(np.append(chips, 0), np.append(counts, ramp))
+        before = np.concatenate([[0], chips])
+        after = np.append(chips, 0)
+        step = np.cumsum(filt)[:ramp]
+        data[edges[:, None] + np.arange(ramp)] = before[:, None] + (after - before)[:, None]*step
+
+    preamble = cachedPreamble(int(PREAMBLE_SECONDS*(samplesPerBit*dataRate)))
+    x = np.empty(len(preamble) + len(data), dtype=np.complex128)
+    x[:len(preamble)] = preamble
+    np.multiply(data, 2**14, out=x[len(preamble):])
+    return x
 
 def transmitPacket(sdr,packet,dataRate,samplesPerBit):
-    oneBit = np.repeat(np.array([1.1,-1.1]),samplesPerBit/2)
-    zeroBit = np.repeat(np.array([-1.1,1.1]),samplesPerBit/2)
-    outputSignal = np.array([])
-
-    for i in range(0,len(packet)):
-        if(packet[i] == 1):
-            outputSignal = np.concatenate([outputSignal,oneBit])
-        else:
-            outputSignal = np.concatenate([outputSignal,zeroBit])
-
-    filt = rcosfilter(132,0.8,dataRate,dataRate*samplesPerBit)[1]
-    x = np.array([])
-    x = np.concatenate([x, np.repeat(1, int(0.160*(samplesPerBit*dataRate)))])
-    x = np.concatenate([x,np.convolve(filt,np.exp(1j*outputSignal))])
-    x *= 2**14
-    sdr.tx(x)
+    sdr.tx(buildWaveform(packet,dataRate,samplesPerBit))
 
 class gps:
     def __init__(self):
@@ -112,6 +118,8 @@ class gps:
 
 
 if __name__ == "__main__":
+    import adi
+    from waveform_cache import WaveformCache
 
     dataRate = 400
     samplesPerBit = 170*10
@@ -128,6 +136,9 @@ if __name__ == "__main__":
     gpsCoords.latitude = 38.624593
     gpsCoords.longitude = -90.185037
 
+    #The coordinates never change, so the waveform is rendered once
+    cache = WaveformCache(data_rate=dataRate, samples_per_bit=samplesPerBit)
+    packet = createPacket(gpsCoords)
     lastTransmitTime = 0
 
     while True:
@@ -136,6 +147,5 @@ if __name__ == "__main__":
         if(time.time() - lastTransmitTime >= 60):
             lastTransmitTime = time.time()
             
-            packet = createPacket(gpsCoords)
-            transmitPacket(sdr,packet,dataRate,samplesPerBit)
+            cache.transmit(sdr, packet)
 
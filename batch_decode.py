@@ -0,0 +1,287 @@
+# ===========================================
+# Batch Decoding of Recorded Captures
+# ===========================================
+
+import time
+
+import numpy as np
+
+from beacon_frame import FRAME_BITS, FRAME_SYNC, BeaconFrame
+from filterbank import next_pow2
+from framesync import BEACON_SYNC
+
+BIT_RATE = 400  # bits/s
+PREAMBLE_SECONDS = 0.160  # unmodulated carrier ahead of the frame
+BURST_SECONDS = PREAMBLE_SECONDS + FRAME_BITS / BIT_RATE
+# One-sided spread of a burst around its carrier: the bit sync is a 400 Hz
+# square wave in biphase-L, whose first harmonics outweigh the carrier itself
+BURST_BANDWIDTH = 4 * BIT_RATE  # Hz
+
+# Working rates: samples per bit after each boxcar decimation stage
+DETECT_SAMPLES_PER_BIT = 128
+DEMOD_SAMPLES_PER_BIT = 32
+
+
+def boxcar_decimate(x, factor):
+    """
+    Averages non-overlapping groups of factor samples along the last axis.
+    Good enough ahead of integrate-and-dump bit decisions.
+    """
+    if factor <= 1:
+        return x
+    n = x.shape[-1] // factor
+    return x[..., :n * factor].reshape(x.shape[:-1] + (n, factor)).mean(axis=-1)
+
+
+def _peak_frequencies(power):
+    """
+    Peak bin of each row with parabolic interpolation, in cycles/sample.
+    """
+    nfft = power.shape[-1]
+    rows = np.arange(power.shape[0])
+    peak = np.argmax(power, axis=-1)
+    left = power[rows, peak - 1]
+    centre = power[rows, peak]
+    right = power[rows, (peak + 1) % nfft]
+    denom = left - 2 * centre + right
+    delta = np.where(denom != 0, 0.5 * (left - right) / np.where(denom != 0, denom, 1), 0.0)
+    freq = (peak + delta) / nfft
+    return np.where(freq >= 0.5, freq - 1.0, freq)
+
+
+def _dilate(mask, radius):
+    """
+    Marks every cell within radius bins (circularly) of a set cell in its row.
+    """
+    if radius <= 0:
+        return mask
+    padded = np.concatenate([mask[:, -radius:], mask, mask[:, :radius]], axis=1)
+    counts = np.concatenate([np.zeros((mask.shape[0], 1), dtype=np.int64), np.cumsum(padded, axis=1)], axis=1)
+    return counts[:, 2 * radius + 1:] - counts[:, :-2 * radius - 1] > 0
+
+
+def detect_bursts(x, sample_rate, threshold_db=13.0, window_seconds=0.016, quiet_seconds=0.05, chunk_windows=2048):
+    """
+    Finds burst starts in a (decimated) capture. The capture is cut into
+    windows that are transformed together with one 2-D FFT per chunk, and
+    every (window, bin) cell standing threshold_db above its window's
+    noise floor is a hit. A burst starts at a hit whose neighbourhood in
+    frequency (BURST_BANDWIDTH either side) has been quiet for
+    quiet_seconds, so overlapping bursts on distinct carriers are found
+    separately. Nearby new hits in one window are one burst; the offset
+    is that of its strongest cell and may be a sync sideband rather than
+    the carrier.
+    Returns (start indices, coarse carrier offsets in Hz).
+    """
+    window = next_pow2(int(window_seconds * sample_rate))
+    num_windows = len(x) // window
+    taper = np.hanning(window)
+    threshold = 10 ** (threshold_db / 10)
+    guard = int(np.ceil(quiet_seconds * sample_rate / window))
+    radius = int(np.ceil(BURST_BANDWIDTH * window / sample_rate))
+    comb = int(np.ceil(BIT_RATE * window / sample_rate))
+    last_seen = np.full(window, -guard - 1, dtype=np.int64)
+
+    starts = []
+    offsets = []
+    for first in range(0, num_windows, chunk_windows):
+        count = min(chunk_windows, num_windows - first)
+        frames = x[first * window:(first + count) * window].reshape(count, window) * taper
+        power = np.abs(np.fft.fft(frames, axis=1)) ** 2
+
+        # Median of exponentially distributed noise power is ln(2) times its mean
+        floor = np.median(power, axis=1, keepdims=True) / np.log(2)
+        hits = power >= threshold * floor
+        near = _dilate(hits, radius)
+
+        # Last window (up to and including this one) with activity near each bin
+        index = first + np.arange(count)[:, None]
+        seen = np.maximum(np.maximum.accumulate(np.where(near, index, -guard - 1), axis=0), last_seen)
+        previous = np.vstack([last_seen[None, :], seen[:-1]])
+        new = hits & (index - previous > guard)
+        last_seen = seen[-1]
+
+        # One detection per run of hits, bridging the 800 Hz line spacing of the bit sync
+        for row in np.flatnonzero(new.any(axis=1)):
+            runs = np.cumsum(np.diff(_dilate(hits[row:row + 1], comb)[0].astype(np.int8), prepend=0) == 1)
+            cells = np.flatnonzero(new[row])
+            for run in np.unique(runs[cells]):
+                members = cells[runs[cells] == run]
+                cell = members[np.argmax(power[row, members])]
+                left, centre, right = power[row, cell - 1], power[row, cell], power[row, (cell + 1) % window]
+                denom = left - 2 * centre + right
+                bin_freq = cell + (0.5 * (left - right) / denom if denom != 0 else 0.0)
+                if bin_freq >= window / 2:
+                    bin_freq -= window
+                starts.append((first + row) * window)
+                offsets.append(bin_freq * sample_rate / window)
+
+    return np.array(starts, dtype=np.int64), np.array(offsets)
+
+
+def _sync_template(samples_per_bit):
+    """
+    Biphase-L waveform of the bit and frame sync, as the sign of the phase.
+    """
+    chips = np.stack([2.0 * BEACON_SYNC - 1, 1 - 2.0 * BEACON_SYNC], axis=1).ravel()
+    boundaries = np.round(np.arange(len(chips) + 1) * samples_per_bit / 2).astype(np.int64)
+    return np.repeat(chips, np.diff(boundaries))
+
+
+def demodulate_bursts(segments, sample_rate, offsets_hz, average_bits=16, search_hz=BURST_BANDWIDTH, metrics=None):
+    """
+    Demodulates a (bursts, samples) array of phase-modulated biphase-L
+    bursts together. Every step is an array operation over all rows:
+    carrier removal, decimation, carrier phase tracking, sync correlation
+    and integrate-and-dump bit decisions. Returns a (bursts, 144) bit
+    matrix, the sync Hamming distance of each row, and each row's carrier
+    offset (Hz, coarse plus fine) and bit SNR (dB, from the spread of the
+    soft decisions). With metrics, records the "cfo" (carrier removal
+    and decimation), "demodulate" (phase tracking and bit decisions) and
+    "sync" (sync correlation) stage times, items being bursts.
+    """
+    num_bursts, length = segments.shape
+    n = np.arange(length)
+    start_ns = time.perf_counter_ns()
+
+    # Coarse carrier removal and decimation, then the carrier line within
+    # search_hz over the whole burst; the limit keeps a row off a
+    # neighbouring burst's carrier. The FFT is sized to the decimated burst.
+    rows = segments * np.exp(-2j * np.pi * np.outer(offsets_hz / sample_rate, n))
+    factor = max(1, int(sample_rate // (BIT_RATE * DEMOD_SAMPLES_PER_BIT)))
+    rows = boxcar_decimate(rows, factor)
+    rate = sample_rate / factor
+    samples_per_bit = rate / BIT_RATE
+    nfft = 4 * next_pow2(rows.shape[1])
+    power = np.abs(np.fft.fft(rows, nfft, axis=1)) ** 2
+    power[:, np.abs(np.fft.fftfreq(nfft, 1 / rate)) > search_hz] = 0
+    fine = _peak_frequencies(power)
+    del power
+    rows *= np.exp(-2j * np.pi * np.outer(fine, np.arange(rows.shape[1])))
+    carrier_ns = time.perf_counter_ns()
+
+    # Biphase-L data averages out over whole bits, leaving the carrier as phase reference
+    span = int(round(average_bits * samples_per_bit))
+    totals = np.concatenate([np.zeros((num_bursts, 1)), np.cumsum(rows, axis=1)], axis=1)
+    lo = np.clip(np.arange(rows.shape[1]) - span // 2, 0, rows.shape[1])
+    hi = np.clip(np.arange(rows.shape[1]) + span // 2, 0, rows.shape[1])
+    reference = totals[:, hi] - totals[:, lo]
+    quadrature = (rows * np.conj(reference) / (np.abs(reference) + 1e-12)).imag
+
+    # Frame start and polarity from correlation with the sync waveform
+    phase_ns = time.perf_counter_ns()
+    template = _sync_template(samples_per_bit)
+    frame_length = int(np.ceil(FRAME_BITS * samples_per_bit))
+    nfft = next_pow2(quadrature.shape[1] + len(template))
+    correlation = np.fft.irfft(np.fft.rfft(quadrature, nfft, axis=1) * np.conj(np.fft.rfft(template, nfft)), nfft, axis=1)
+    correlation = correlation[:, :max(quadrature.shape[1] - frame_length, 1)]
+    start = np.argmax(np.abs(correlation), axis=1)
+    polarity = np.sign(correlation[np.arange(num_bursts), start])
+    sync_ns = time.perf_counter_ns()
+
+    # Integrate-and-dump: first half minus second half of every bit
+    totals = np.concatenate([np.zeros((num_bursts, 1)), np.cumsum(quadrature, axis=1)], axis=1)
+    edges = start[:, None] + np.round(np.arange(2 * FRAME_BITS + 1) * samples_per_bit / 2).astype(np.int64)
+    edges = np.minimum(edges, totals.shape[1] - 1)
+    halves = np.diff(np.take_along_axis(totals, edges, axis=1), axis=1)
+    soft = (halves[:, 0::2] - halves[:, 1::2]) * polarity[:, None]
+    bits = (soft > 0).astype(np.uint8)
+
+    sync_distance = (bits[:, :len(BEACON_SYNC)] != BEACON_SYNC).sum(axis=1)
+    magnitude = np.abs(soft)
+    snr_db = 10 * np.log10(magnitude.mean(axis=1) ** 2 / (magnitude.var(axis=1) + 1e-30) + 1e-30)
+    if metrics is not None:
+        metrics.record("cfo", carrier_ns - start_ns, num_bursts)
+        metrics.record("demodulate", phase_ns - carrier_ns + time.perf_counter_ns() - sync_ns, num_bursts)
+        metrics.record("sync", sync_ns - phase_ns, num_bursts)
+    return bits, sync_distance, offsets_hz + fine * rate, snr_db
+
+
+def decode_bursts(iq, sample_rate=1e6, batch_size=64, max_sync_errors=3, threshold_db=15.0, metrics=None,
+                  strict=True):
+    """
+    Decodes every beacon burst in a recorded capture. Yields (sample
+    index of the burst detection, frame, quality) for the frames that
+    pass the sync and BCH checks (after correction, BeaconFrame.corrected()
+    with strict, as the streaming BurstDecoder does), in capture order;
+    quality has the burst's cfo_hz and snr_db and the sync_errors and
+    corrected_bits forgiven. With metrics, records a "detect" time for
+    the capture, the demodulate_bursts() stages per batch and a "bch"
+    time per batch.
+    """
+    start_ns = time.perf_counter_ns()
+    iq = np.asarray(iq)
+    factor = max(1, int(sample_rate // (BIT_RATE * DETECT_SAMPLES_PER_BIT)))
+    x = boxcar_decimate(iq.astype(np.complex64, copy=False), factor)
+    rate = sample_rate / factor
+
+    starts, offsets = detect_bursts(x, rate, threshold_db=threshold_db)
+    if metrics is not None:
+        metrics.record("detect", time.perf_counter_ns() - start_ns, len(iq))
+
+    # Segments run from a little before the detection to past the burst end
+    lead = int(PREAMBLE_SECONDS * rate)
+    length = int((BURST_SECONDS + 2 * PREAMBLE_SECONDS) * rate)
+    padded = np.concatenate([np.zeros(lead, dtype=x.dtype), x, np.zeros(length, dtype=x.dtype)])
+
+    last_start = {}
+    for first in range(0, len(starts), batch_size):
+        batch = starts[first:first + batch_size]
+        segments = padded[batch[:, None] + np.arange(length)]
+        bits, sync_distance, cfo, snr = demodulate_bursts(segments, rate, offsets[first:first + batch_size],
+                                                          metrics=metrics)
+        start_ns = time.perf_counter_ns()
+        checked = []
+        for frame, distance, start, cfo_hz, snr_db in zip(BeaconFrame.from_bit_matrix(bits), sync_distance, batch,
+                                                          cfo, snr):
+            if distance > max_sync_errors:
+                continue
+            try:
+                checked.append((frame.corrected(strict), distance, start, cfo_hz, snr_db))
+            except ValueError:
+                continue
+        if metrics is not None:
+            metrics.record("bch", time.perf_counter_ns() - start_ns, len(batch))
+
+        for (frame, corrected), distance, start, cfo_hz, snr_db in checked:
+            # Two detections of one burst decode to the same message (sync errors aside)
+            message = frame.field(FRAME_SYNC[1], FRAME_BITS)
+            if start - last_start.get(message, -length) < length:
+                continue
+            last_start[message] = start
+            quality = {"cfo_hz": float(cfo_hz), "snr_db": float(snr_db), "sync_errors": int(distance),
+                       "corrected_bits": corrected}
+            yield int(start) * factor, frame, quality
+
+
+def decode_capture(iq, sample_rate=1e6, batch_size=64, max_sync_errors=3, threshold_db=15.0):
+    """
+    Decodes every beacon burst in a recorded capture. Returns the frames
+    that pass the sync and BCH checks (after correction), in capture order.
+    """
+    return [frame for _, frame, _ in decode_bursts(iq, sample_rate, batch_size, max_sync_errors, threshold_db)]
+
+
+def decode_segment(segment, sample_rate, offset_hz, max_sync_errors=3, strict=True, metrics=None):
+    """
+    Decodes the one burst in a segment already known to hold it (from a
+    little before the preamble to past the burst end), with its coarse
+    carrier offset in Hz, e.g. from a carrier detector. Returns (frame,
+    quality) as decode_bursts() yields them, or None if the frame fails
+    the sync or BCH check (BeaconFrame.corrected() with strict). With
+    metrics, records the demodulate_bursts() stages and a "bch" time.
+    """
+    bits, sync_distance, cfo, snr = demodulate_bursts(np.asarray(segment)[None, :], sample_rate, np.array([offset_hz]),
+                                                      metrics=metrics)
+    if sync_distance[0] > max_sync_errors:
+        return None
+    start_ns = time.perf_counter_ns()
+    try:
+        frame, corrected = BeaconFrame.from_bit_matrix(bits)[0].corrected(strict)
+    except ValueError:
+        return None
+    finally:
+        if metrics is not None:
+            metrics.record("bch", time.perf_counter_ns() - start_ns, 1)
+    return frame, {"cfo_hz": float(cfo[0]), "snr_db": float(snr[0]), "sync_errors": int(sync_distance[0]),
+                   "corrected_bits": corrected}
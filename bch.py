@@ -0,0 +1,115 @@
+# ===========================================
+# BCH Error Detection/Correction for Long-Format Beacon Frames
+# ===========================================
+
+from itertools import combinations
+
+import numpy as np
+
+
+def bits_to_int(bits):
+    """
+    Packs a 0/1 sequence (MSB first) into a Python int.
+    """
+    bits = np.asarray(bits, dtype=np.uint8)
+    pad = (-len(bits)) % 8
+    packed = np.packbits(np.concatenate([np.zeros(pad, dtype=np.uint8), bits]))
+    return int.from_bytes(packed.tobytes(), "big")
+
+
+def int_to_bits(value, num_bits):
+    """
+    Unpacks the low num_bits of an int into a 0/1 uint8 array, MSB first.
+    """
+    num_bytes = (num_bits + 7) // 8
+    raw = np.frombuffer(int(value).to_bytes(num_bytes, "big"), dtype=np.uint8)
+    return np.unpackbits(raw)[8 * num_bytes - num_bits:]
+
+
+class BchCode:
+    """
+    Binary BCH code with a byte-wise remainder table (as in a table CRC)
+    and syndrome lookup correction of up to max_errors bit errors.
+    Codewords are Python ints: data bits followed by parity bits.
+    """
+
+    def __init__(self, generator, data_bits, max_errors):
+        self.generator = generator
+        self.parity_bits = generator.bit_length() - 1
+        self.data_bits = data_bits
+        self.codeword_bits = data_bits + self.parity_bits
+        self.max_errors = max_errors
+        self._mask = (1 << self.parity_bits) - 1
+        self._table = [self._slow_remainder(byte << self.parity_bits) for byte in range(256)]
+        self._patterns = None
+
+    def _slow_remainder(self, value):
+        """
+        Bit-by-bit polynomial long division; only used to build the table.
+        """
+        degree = self.parity_bits
+        while value.bit_length() > degree:
+            value ^= self.generator << (value.bit_length() - 1 - degree)
+        return value
+
+    def remainder(self, value, num_bits):
+        """
+        value(x) * x^parity_bits mod g(x), consuming value one byte at a time.
+        """
+        shift = self.parity_bits - 8
+        register = 0
+        for pos in range(((num_bits + 7) // 8 - 1) * 8, -1, -8):
+            byte = (value >> pos) & 0xFF
+            register = ((register << 8) & self._mask) ^ self._table[((register >> shift) ^ byte) & 0xFF]
+        return register
+
+    def encode(self, data):
+        """
+        Parity bits for data_bits of data.
+        """
+        return self.remainder(data, self.data_bits)
+
+    def syndrome(self, codeword):
+        """
+        Zero for a valid codeword. Because the parity is the remainder of
+        data * x^r, a codeword is valid when its data re-encodes to its parity.
+        """
+        return self.encode(codeword >> self.parity_bits) ^ (codeword & self._mask)
+
+    def _error_patterns(self):
+        """
+        Syndrome -> error pattern for every pattern of up to max_errors bits.
+        The syndrome is linear, so each pattern's syndrome is the XOR of the
+        single-bit syndromes. Built on first use.
+        """
+        single = [self.syndrome(1 << i) for i in range(self.codeword_bits)]
+        table = {}
+        for weight in range(1, self.max_errors + 1):
+            for positions in combinations(range(self.codeword_bits), weight):
+                syndrome = 0
+                pattern = 0
+                for i in positions:
+                    syndrome ^= single[i]
+                    pattern |= 1 << i
+                table[syndrome] = pattern
+        return table
+
+    def correct(self, codeword):
+        """
+        Returns (corrected codeword, number of bits flipped).
+        Raises ValueError if more than max_errors bits are wrong.
+        """
+        syndrome = self.syndrome(codeword)
+        if syndrome == 0:
+            return codeword, 0
+        if self._patterns is None:
+            self._patterns = self._error_patterns()
+        pattern = self._patterns.get(syndrome)
+        if pattern is None:
+            raise ValueError(f"BCH({self.codeword_bits},{self.data_bits}) check failed: more than {self.max_errors} bit errors")
+        return codeword ^ pattern, bin(pattern).count("1")
+
+
+# BCH(82,61) over PDF-1 and BCH(38,26) over PDF-2
+BCH1 = BchCode(0b1001101101100111100011, 61, 3)
+BCH2 = BchCode(0b1010100111001, 26, 2)
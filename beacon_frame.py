@@ -0,0 +1,160 @@
+# ===========================================
+# Bit-Packed Long-Format Beacon Frame
+# ===========================================
+
+import numpy as np
+
+from bch import BCH1, BCH2
+
+FRAME_BITS = 144
+FRAME_BYTES = FRAME_BITS // 8
+
+# Field bit ranges within the frame (0-based, end exclusive), as built by createPacket()
+BIT_SYNC = (0, 15)
+FRAME_SYNC = (15, 24)
+FORMAT_FLAG = (24, 25)
+PROTOCOL_FLAG = (25, 26)
+COUNTRY_CODE = (26, 36)
+PROTOCOL_CODE = (36, 40)
+HEX_ID = (25, 85)
+PDF1 = (24, 85)
+BCH1_PARITY = (85, 106)
+PDF2 = (106, 132)
+BCH2_PARITY = (132, 144)
+LOCATION = (112, 132)
+
+# Coarse position in PDF-1 (0.25 degree steps, sign bit set for south/west)
+LAT_COARSE = (64, 74)
+LON_COARSE = (74, 85)
+# Position offsets in PDF-2 (sign bit set when adding, minutes, 4-second steps)
+LAT_OFFSET = (112, 122)
+LON_OFFSET = (122, 132)
+
+
+def pack_fields(fields):
+    """
+    Concatenates (value, width) pairs, first pair in the most significant bits.
+    """
+    value = 0
+    for field, width in fields:
+        value = (value << width) | (int(field) & ((1 << width) - 1))
+    return value
+
+
+def bit_fields(bit_matrix, start, stop):
+    """
+    Unsigned value of bits [start, stop) for every row of a (frames, 144)
+    0/1 matrix, as an int64 array.
+    """
+    weights = np.left_shift(1, np.arange(stop - start - 1, -1, -1, dtype=np.int64))
+    return np.asarray(bit_matrix)[:, start:stop].astype(np.int64) @ weights
+
+
+class BeaconFrame:
+    """
+    One 144-bit beacon frame held as a single Python int, bit 0 of the
+    frame in the most significant position. Fields are read with a shift
+    and a mask, so no per-bit arrays or strings are built.
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = int(value)
+
+    @classmethod
+    def from_bits(cls, bits, offset=0):
+        """
+        Builds a frame from 144 demodulated 0/1 values starting at offset.
+        """
+        window = np.asarray(bits[offset:offset + FRAME_BITS], dtype=np.uint8)
+        if len(window) < FRAME_BITS:
+            raise ValueError(f"Bitstream too short to contain full beacon frame (len={len(window)})")
+        return cls.from_bytes(np.packbits(window).tobytes())
+
+    @classmethod
+    def from_bit_matrix(cls, bit_matrix):
+        """
+        One frame per row of a (frames, 144) 0/1 matrix, packed in one call.
+        """
+        packed = np.packbits(np.asarray(bit_matrix, dtype=np.uint8)[:, :FRAME_BITS], axis=1)
+        return [cls.from_bytes(row.tobytes()) for row in packed]
+
+    @classmethod
+    def from_bytes(cls, data):
+        return cls(int.from_bytes(data, "big"))
+
+    def to_bytes(self):
+        return self.value.to_bytes(FRAME_BYTES, "big")
+
+    def to_bits(self):
+        return np.unpackbits(np.frombuffer(self.to_bytes(), dtype=np.uint8))
+
+    def field(self, start, stop):
+        """
+        Unsigned value of frame bits [start, stop).
+        """
+        return (self.value >> (FRAME_BITS - stop)) & ((1 << (stop - start)) - 1)
+
+    def with_field(self, start, stop, field):
+        mask = ((1 << (stop - start)) - 1) << (FRAME_BITS - stop)
+        return BeaconFrame((self.value & ~mask) | ((int(field) << (FRAME_BITS - stop)) & mask))
+
+    @property
+    def format_flag(self):
+        return self.field(*FORMAT_FLAG)
+
+    @property
+    def protocol_flag(self):
+        return self.field(*PROTOCOL_FLAG)
+
+    @property
+    def country_code(self):
+        return self.field(*COUNTRY_CODE)
+
+    @property
+    def protocol_code(self):
+        return self.field(*PROTOCOL_CODE)
+
+    @property
+    def hex_id(self):
+        """
+        15 hex character beacon ID (frame bits 26-85 in 1-based numbering).
+        """
+        return f"{self.field(*HEX_ID):015X}"
+
+    @property
+    def location(self):
+        return self.field(*LOCATION)
+
+    def corrected(self, strict=False):
+        """
+        Checks PDF-1 and PDF-2 against BCH1/BCH2 and returns
+        (corrected frame, number of bits fixed). Raises ValueError if
+        either field has more errors than its code can correct, or with
+        strict if both needed their code's full correction capability:
+        about 0.9% of random 144-bit windows pass full correction, most
+        of them that way, against 0.08% under strict.
+        """
+        value = self.value
+        fixed = 0
+        saturated = True
+        for code, (_, stop) in ((BCH1, BCH1_PARITY), (BCH2, BCH2_PARITY)):
+            shift = FRAME_BITS - stop
+            mask = (1 << code.codeword_bits) - 1
+            codeword, flipped = code.correct((value >> shift) & mask)
+            value = (value & ~(mask << shift)) | (codeword << shift)
+            fixed += flipped
+            saturated = saturated and flipped == code.max_errors
+        if strict and saturated:
+            raise ValueError("BCH check failed: both codewords needed full correction")
+        return BeaconFrame(value), fixed
+
+    def __eq__(self, other):
+        return isinstance(other, BeaconFrame) and self.value == other.value
+
+    def __hash__(self):
+        return hash(self.value)
+
+    def __repr__(self):
+        return f"BeaconFrame(0x{self.value:036X})"
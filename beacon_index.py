@@ -0,0 +1,136 @@
+# ===========================================
+# Beacon Index: Repeated Bursts Merged into One Track per Hex ID
+# ===========================================
+
+import math
+import time
+from collections import OrderedDict
+
+
+def decode_confidence(corrected_bits=0, sync_errors=0):
+    """
+    Position weight of one decode: 1 for a clean frame, less the more
+    bits BCH correction or the sync match had to forgive.
+    """
+    return 1.0 / (1 + corrected_bits + sync_errors)
+
+
+class BeaconTrack:
+    """
+    Everything heard from one hex_id: first/last time seen, detection
+    count, the latest fields and the confidence-weighted mean position
+    of the decodes since the encoded location last changed (a new fix
+    replaces the old one rather than being blended with it). Positions
+    are averaged as unit vectors, so tracks near the poles or the
+    antimeridian average correctly.
+    """
+
+    __slots__ = ("hex_id", "fields", "first_seen", "last_seen", "detections", "weight", "_x", "_y", "_z")
+
+    def __init__(self, hex_id, now):
+        self.hex_id = hex_id
+        self.fields = None
+        self.first_seen = now
+        self.last_seen = now
+        self.detections = 0
+        self.weight = 0.0
+        self._x = self._y = self._z = 0.0
+
+    def add(self, beacon_info, confidence, now):
+        if self.fields is not None and self.fields["location_hex"] != beacon_info["location_hex"]:
+            self.weight = 0.0
+            self._x = self._y = self._z = 0.0
+        lat, lon = math.radians(beacon_info["latitude"]), math.radians(beacon_info["longitude"])
+        self._x += confidence * math.cos(lat) * math.cos(lon)
+        self._y += confidence * math.cos(lat) * math.sin(lon)
+        self._z += confidence * math.sin(lat)
+        self.weight += confidence
+        self.detections += 1
+        self.last_seen = now
+        self.fields = beacon_info
+
+    @property
+    def position(self):
+        """
+        (latitude, longitude) in degrees of the current fix, weighted by
+        decode confidence.
+        """
+        return (
+            math.degrees(math.atan2(self._z, math.hypot(self._x, self._y))),
+            math.degrees(math.atan2(self._y, self._x)),
+        )
+
+    def summary(self):
+        """
+        The latest fields with the averaged position and track statistics.
+        """
+        latitude, longitude = self.position
+        return dict(self.fields, latitude=latitude, longitude=longitude, detections=self.detections,
+                    first_seen=self.first_seen, last_seen=self.last_seen)
+
+
+class BeaconIndex:
+    """
+    Tracks keyed by hex_id, in least recently heard order. update() is
+    one dictionary lookup; tracks not heard for ttl seconds are dropped
+    as later updates come in, and past max_tracks the least recently
+    heard goes, so memory stays bounded however long the receiver runs.
+    """
+
+    def __init__(self, ttl=600.0, max_tracks=1024):
+        self.ttl = ttl
+        self.max_tracks = max_tracks
+        self.expired = 0
+        self._tracks = OrderedDict()
+
+    def __len__(self):
+        return len(self._tracks)
+
+    def __contains__(self, hex_id):
+        return hex_id in self._tracks
+
+    def get(self, hex_id):
+        return self._tracks.get(hex_id)
+
+    def tracks(self):
+        return list(self._tracks.values())
+
+    def update(self, beacon_info, confidence=1.0, now=None):
+        """
+        Merges one decoded beacon (extract_beacon_fields() dict) into its
+        track. Returns (track, changed): changed is True for a new beacon,
+        one whose encoded location or country code differs from its last
+        decode, or one that had aged out, and False for a plain repeat,
+        which callers need not log or display again.
+        """
+        now = time.time() if now is None else now
+        self.expire(now)
+
+        hex_id = beacon_info["hex_id"]
+        track = self._tracks.get(hex_id)
+        if track is None:
+            track = self._tracks[hex_id] = BeaconTrack(hex_id, now)
+            changed = True
+            if len(self._tracks) > self.max_tracks:
+                self._tracks.popitem(last=False)
+                self.expired += 1
+        else:
+            self._tracks.move_to_end(hex_id)
+            last = track.fields
+            changed = (last["location_hex"], last["country_code"]) != (beacon_info["location_hex"], beacon_info["country_code"])
+        track.add(beacon_info, confidence, now)
+        return track, changed
+
+    def expire(self, now=None):
+        """
+        Drops tracks not heard for ttl seconds and returns them.
+        """
+        now = time.time() if now is None else now
+        expired = []
+        while self._tracks:
+            track = next(iter(self._tracks.values()))
+            if now - track.last_seen < self.ttl:
+                break
+            expired.append(self._tracks.popitem(last=False)[1])
+        self.expired += len(expired)
+        return expired
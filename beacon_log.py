@@ -0,0 +1,273 @@
+# ===========================================
+# Asynchronous Beacon Log: Queue, Batched File Writes, Throttled Terminal
+# ===========================================
+
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import warnings
+from datetime import datetime, timezone
+
+from detection_store import DetectionStore
+from kml_writer import KmlWriter
+
+
+def beacon_record(beacon_info):
+    """
+    Log record for one decoded beacon: the extract_beacon_fields()
+    fields plus the UTC time, taken once here.
+    """
+    record = dict(beacon_info)
+    record["time"] = datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+    return record
+
+
+def format_beacon(record):
+    return (
+        "\n" + "=" * 40 + "\n"
+        "🚨 406.025 MHz SARSAT BEACON DETECTED\n"
+        f"Time: {record['time']}\n"
+        f"Country Code: {record['country_code']}\n"
+        f"Beacon Hex ID: {record['hex_id']}\n"
+        f"Encoded Location: {record['location_hex']}\n"
+        f"Latitude: {record['latitude']:.6f}\n"
+        f"Longitude: {record['longitude']:.6f}\n"
+        + "=" * 40 + "\n"
+    )
+
+
+class LogSink:
+    """
+    Destination for batches of records. write() gets every batch, poll()
+    is called on every pass of the writer thread (for timed work) and
+    close() once at the end. All three run on the writer thread only.
+    """
+
+    def write(self, records):
+        raise NotImplementedError
+
+    def poll(self, now):
+        pass
+
+    def close(self):
+        pass
+
+
+class SyncedSink(LogSink):
+    """
+    Sink that writes through buffered files, flushed and fsynced every
+    fsync_seconds (and on close) rather than per record. Subclasses set
+    _dirty when they write and implement sync().
+    """
+
+    def __init__(self, fsync_seconds=5.0):
+        self.fsync_seconds = fsync_seconds
+        self._synced = time.monotonic()
+        self._dirty = False
+
+    def sync(self):
+        raise NotImplementedError
+
+    def poll(self, now):
+        if self._dirty and now - self._synced >= self.fsync_seconds:
+            self.sync()
+            self._dirty = False
+            self._synced = now
+
+
+class FileSink(SyncedSink):
+    """
+    Buffered text file kept open for the whole run, one format() string
+    per record.
+    """
+
+    def __init__(self, path, mode="a", fsync_seconds=5.0):
+        super().__init__(fsync_seconds)
+        self.path = path
+        self._file = open(path, mode, buffering=1 << 16, encoding="utf-8")
+
+    def write(self, records):
+        self._file.write("".join(self.format(record) for record in records))
+        self._dirty = True
+
+    def format(self, record):
+        raise NotImplementedError
+
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self.sync()
+        self._file.close()
+
+
+class JsonLinesSink(FileSink):
+    """
+    One JSON object per record, appended.
+    """
+
+    def format(self, record):
+        return json.dumps(record) + "\n"
+
+
+class KmlSink(SyncedSink):
+    """
+    Beacon map kept by a KmlWriter (valid after every batch, one track
+    per hex_id, rotated past a size limit); writer_args go to KmlWriter.
+    """
+
+    def __init__(self, path="beacon_locations.kml", fsync_seconds=5.0, **writer_args):
+        super().__init__(fsync_seconds)
+        self.writer = KmlWriter(path, **writer_args)
+
+    def write(self, records):
+        self.writer.write(records)
+        self._dirty = True
+
+    def sync(self):
+        self.writer.sync()
+
+    def close(self):
+        self.writer.close()
+
+
+class DetectionSink(SyncedSink):
+    """
+    Every record into a DetectionStore, one transaction per batch, with a
+    WAL checkpoint every fsync_seconds; store_args go to DetectionStore.
+    """
+
+    def __init__(self, path="detections.db", fsync_seconds=5.0, **store_args):
+        super().__init__(fsync_seconds)
+        self.store = DetectionStore(path, **store_args)
+
+    def write(self, records):
+        self.store.insert(records)
+        self._dirty = True
+
+    def sync(self):
+        self.store.checkpoint()
+
+    def close(self):
+        self.store.close()
+
+
+class TerminalSink(LogSink):
+    """
+    Prints the beacons received since the last refresh, at most once
+    every refresh_seconds and in one write; past max_beacons per refresh
+    only a count of the rest is printed.
+    """
+
+    def __init__(self, refresh_seconds=1.0, max_beacons=4, stream=None):
+        self.refresh_seconds = refresh_seconds
+        self.max_beacons = max_beacons
+        self.stream = stream or sys.stdout
+        self._pending = []
+        self._shown = 0.0
+
+    def write(self, records):
+        self._pending += records
+
+    def poll(self, now):
+        if self._pending and now - self._shown >= self.refresh_seconds:
+            self.show()
+            self._shown = now
+
+    def show(self):
+        text = "".join(format_beacon(record) for record in self._pending[:self.max_beacons])
+        if len(self._pending) > self.max_beacons:
+            text += f"... and {len(self._pending) - self.max_beacons} more beacons\n"
+        self.stream.write(text)
+        self.stream.flush()
+        self._pending = []
+
+    def close(self):
+        if self._pending:
+            self.show()
+
+
+class AsyncLogger:
+    """
+    Hands decoded beacons from the decode loop to the sinks. log() only
+    builds a record and puts it on a bounded queue (dropping it, counted
+    in dropped, if the writer has fallen max_queue records behind); a
+    daemon thread takes records off in batches of up to batch_size and
+    writes them to every sink, polling the sinks at least every
+    poll_seconds. close() writes out what is queued and closes the sinks.
+    A sink that raises is closed and moved to failed, with the exception
+    kept in error; the thread carries on with the other sinks.
+    """
+
+    def __init__(self, sinks, max_queue=1024, batch_size=256, poll_seconds=0.1):
+        self.sinks = list(sinks)
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.logged = 0
+        self.dropped = 0
+        self.error = None
+        self.failed = []
+        self._queue = queue.Queue(max_queue)
+        self._closing = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def log(self, beacon_info):
+        try:
+            self._queue.put_nowait(beacon_record(beacon_info))
+            self.logged += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def _batch(self):
+        try:
+            batch = [self._queue.get(timeout=self.poll_seconds)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _disable(self, sink, error):
+        self.error = error
+        self.sinks.remove(sink)
+        self.failed.append(sink)
+        warnings.warn(f"{type(sink).__name__} disabled: {error!r}")
+        try:
+            sink.close()
+        except Exception:
+            pass
+
+    def _run(self):
+        while not (self._closing.is_set() and self._queue.empty()):
+            batch = self._batch()
+            now = time.monotonic()
+            for sink in list(self.sinks):
+                try:
+                    if batch:
+                        sink.write(batch)
+                    sink.poll(now)
+                except Exception as e:
+                    self._disable(sink, e)
+        for sink in list(self.sinks):
+            try:
+                sink.close()
+            except Exception as e:
+                self.error = e
+
+    def close(self, timeout=5.0):
+        self._closing.set()
+        self._thread.join(timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
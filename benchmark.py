@@ -0,0 +1,440 @@
+# ===========================================
+# DSP Throughput Benchmarks
+# ===========================================
+
+import argparse
+import json
+import platform
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from batch_decode import decode_capture
+from decode_pool import DecodePool, decode_burst
+from channelizer import BEACON_CHANNELS_HZ, CHANNEL_SPACING, PolyphaseChannelizer
+from decimator import DecimationChain
+from costas import HAVE_NUMBA, CostasLoop, OpenLoopCarrierRecovery, reference_costas_loop
+from framesync import BEACON_SYNC, find_sync_candidates
+from preamble import CarrierDetector
+from streaming import BurstDecoder, StreamingBpskDemodulator
+from beacon_frame import BeaconFrame
+from filterbank import cached_rcosfilter, convolve
+from location import decode_location
+from Test_Beacon import buildWaveform, calculateBCH, createPacket, gps
+
+
+def synthetic_bpsk(n, samples_per_symbol=20, cfo=0.002, snr_db=10.0, seed=0):
+    """
+    Random BPSK baseband with a carrier offset (radians/sample) and AWGN.
+    """
+    rng = np.random.default_rng(seed)
+    symbols = rng.choice([-1.0, 1.0], size=n // samples_per_symbol + 1)
+    baseband = np.repeat(symbols, samples_per_symbol)[:n]
+    noise_std = 10 ** (-snr_db / 20) / np.sqrt(2)
+    noise = noise_std * (rng.standard_normal(n) + 1j * rng.standard_normal(n))
+    return baseband * np.exp(1j * cfo * np.arange(n)) + noise
+
+
+def time_call(func, repeat=3):
+    """
+    Best-of-N wall time for func() in seconds.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_costas(n=1 << 16, repeat=3):
+    signal = synthetic_bpsk(n)
+    loop = CostasLoop()
+    loop.process(signal[:1024])  # warm up the numba kernel outside the timing
+    open_loop = OpenLoopCarrierRecovery()
+
+    results = {
+        "reference costas_loop": time_call(lambda: reference_costas_loop(signal), repeat),
+        "CostasLoop" + (" (numba)" if HAVE_NUMBA else " (python)"): time_call(lambda: loop.process(signal), repeat),
+        "OpenLoopCarrierRecovery": time_call(lambda: open_loop.process(signal), repeat),
+    }
+    return {name: n / seconds for name, seconds in results.items()}
+
+
+def bench_streaming(n=1 << 16, buffer_size=4096, samples_per_symbol=20, repeat=3):
+    signal = synthetic_bpsk(n, samples_per_symbol)
+    buffers = [signal[i:i + buffer_size] for i in range(0, n, buffer_size)]
+    demodulator = StreamingBpskDemodulator(samples_per_symbol)
+    demodulator.push(buffers[0])
+
+    def run():
+        for buffer in buffers:
+            demodulator.push(buffer)
+
+    return {f"StreamingBpskDemodulator ({buffer_size}/push)": n / time_call(run, repeat)}
+
+
+def bench_decimated(n=1 << 16, buffer_size=16 * 4096, sample_rate=1e6, repeat=3):
+    """
+    The demodulator at the capture rate with samples_per_symbol=20, as
+    the scripts used to run it, against the same input decimated first.
+    """
+    signal = synthetic_bpsk(n, samples_per_symbol=int(sample_rate // 400), cfo=0.0)
+    buffers = [signal[i:i + buffer_size] for i in range(0, n, buffer_size)]
+    full_rate = StreamingBpskDemodulator(20)
+    decimated = StreamingBpskDemodulator(decimator=DecimationChain(sample_rate))
+
+    def run(demodulator):
+        for buffer in buffers:
+            demodulator.push(buffer)
+
+    results = {
+        "StreamingBpskDemodulator (1 MS/s)": time_call(lambda: run(full_rate), repeat),
+        f"DecimationChain + demodulator (/{decimated.decimator.factor})": time_call(lambda: run(decimated), repeat),
+    }
+    return {name: n / seconds for name, seconds in results.items()}
+
+
+def bench_detector(n=1 << 16, buffer_size=4096, repeat=3):
+    rng = np.random.default_rng(0)
+    noise = (rng.standard_normal(n) + 1j * rng.standard_normal(n)) / np.sqrt(2)
+    buffers = [noise[i:i + buffer_size] for i in range(0, n, buffer_size)]
+    detector = CarrierDetector(1e6)
+
+    def run():
+        for buffer in buffers:
+            detector.push(buffer)
+
+    return {"CarrierDetector (idle channel)": n / time_call(run, repeat)}
+
+
+def bench_channelizer(n=1 << 16, buffer_size=16 * 4096, sample_rate=768000, repeat=3):
+    signal = synthetic_bpsk(n)
+    channelizer = PolyphaseChannelizer(sample_rate)
+
+    def run():
+        for i in range(0, n, buffer_size):
+            channelizer.process(signal[i:i + buffer_size])
+
+    return {f"PolyphaseChannelizer ({channelizer.num_channels} channels)": n / time_call(run, repeat)}
+
+
+def reference_sync_search(bits, pattern, max_distance=4):
+    """
+    Per-offset Python Hamming distance scan, as in safetcode2.py before.
+    """
+    matches = []
+    for i in range(len(bits) - len(pattern) + 1):
+        distance = sum(x != y for x, y in zip(bits[i:i + len(pattern)], pattern))
+        if distance <= max_distance:
+            matches.append(i)
+    return matches
+
+
+def bench_sync(num_bits=1 << 14, repeat=3):
+    rng = np.random.default_rng(0)
+    bits = rng.integers(0, 2, num_bits).astype(np.uint8)
+    results = {
+        "reference sync scan": time_call(lambda: reference_sync_search(bits, BEACON_SYNC), repeat),
+        "find_sync_candidates": time_call(lambda: find_sync_candidates(bits), repeat),
+    }
+    return {name: num_bits / seconds for name, seconds in results.items()}
+
+
+def reference_build_waveform(packet, data_rate, samples_per_bit):
+    """
+    Per-bit np.concatenate waveform builder, as in Test_Beacon.py before
+    (including its unnormalised filter gain).
+    """
+    one_bit = np.repeat(np.array([1.1, -1.1]), samples_per_bit / 2)
+    zero_bit = np.repeat(np.array([-1.1, 1.1]), samples_per_bit / 2)
+    phase = np.array([])
+    for bit in packet:
+        phase = np.concatenate([phase, one_bit if bit == 1 else zero_bit])
+    taps = cached_rcosfilter(132, 0.8, data_rate, data_rate * samples_per_bit)
+    x = np.concatenate([np.repeat(1, int(0.160 * samples_per_bit * data_rate)), convolve(taps, np.exp(1j * phase))])
+    return x * 2 ** 14
+
+
+def bench_waveform(sample_rate=680000, data_rate=400, repeat=3):
+    packet = createPacket(gps())
+    samples_per_bit = sample_rate // data_rate
+    results = {
+        "reference builder": time_call(lambda: reference_build_waveform(packet, data_rate, samples_per_bit), repeat),
+        "buildWaveform": time_call(lambda: buildWaveform(packet, data_rate, samples_per_bit), repeat),
+    }
+    length = len(buildWaveform(packet, data_rate, samples_per_bit))
+    return {name: length / seconds for name, seconds in results.items()}
+
+
+# Rate and tuning safetcode.py receives at: 256 channels of 3 kHz around 406.025 MHz
+RECEIVER_RATE = 256 * CHANNEL_SPACING
+RECEIVER_LO = 406025000
+
+
+def synthetic_capture(num_bursts, sample_rate=680000, data_rate=400, snr_db=0.0, seed=0, channels_hz=None):
+    """
+    Back-to-back beacon bursts from createPacket()/buildWaveform() with
+    random positions, carrier offsets and phases, in AWGN. Each burst is
+    scaled to unit amplitude. With channels_hz (offsets from the tuned
+    frequency), each burst is within 300 Hz of a random one of them.
+    """
+    rng = np.random.default_rng(seed)
+    bursts = []
+    for _ in range(num_bursts):
+        position = gps()
+        position.latitude = rng.uniform(-80, 80)
+        position.longitude = rng.uniform(-170, 170)
+        waveform = buildWaveform(createPacket(position), data_rate, sample_rate // data_rate)
+        waveform = waveform / np.abs(waveform[0])
+        if channels_hz is None:
+            offset = rng.uniform(-3000, 3000) / sample_rate
+        else:
+            offset = (rng.choice(channels_hz) + rng.uniform(-300, 300)) / sample_rate
+        bursts.append(waveform * np.exp(1j * (2 * np.pi * offset * np.arange(len(waveform)) + rng.uniform(0, 2 * np.pi))))
+        bursts.append(np.zeros(int(rng.uniform(0.2, 0.6) * sample_rate)))
+    capture = np.concatenate(bursts)
+    noise_std = 10 ** (-snr_db / 20) / np.sqrt(2)
+    return capture + noise_std * (rng.standard_normal(len(capture)) + 1j * rng.standard_normal(len(capture)))
+
+
+def bench_batch(num_bursts=8, sample_rate=680000, repeat=3):
+    """
+    Decoded frames per second from decode_capture().
+    """
+    capture = synthetic_capture(num_bursts, sample_rate)
+    frames = decode_capture(capture, sample_rate)
+    seconds = time_call(lambda: decode_capture(capture, sample_rate), repeat)
+    return {f"decode_capture ({len(frames)}/{num_bursts} frames)": len(frames) / seconds}
+
+
+def bench_pool(num_bursts=8, num_workers=None, sample_rate=680000, repeat=3):
+    """
+    Decoded frames per second, one burst per block, in this process and
+    through a DecodePool.
+    """
+    blocks = [synthetic_capture(1, sample_rate, seed=seed) for seed in range(num_bursts)]
+    frames = sum(len(decode_burst(block, sample_rate)) for block in blocks)
+    with DecodePool(max(len(block) for block in blocks), num_workers) as pool:
+        def run():
+            for block in blocks:
+                pool.submit(block, sample_rate)
+            while pool.outstanding:
+                list(pool.ready(timeout=1.0))
+
+        results = {
+            "decode_burst (1 process)": time_call(lambda: [decode_burst(block, sample_rate) for block in blocks], repeat),
+            f"DecodePool ({pool.num_workers} workers)": time_call(run, repeat),
+        }
+    return {name: frames / seconds for name, seconds in results.items()}
+
+
+def call_times(func, inputs, repeat=3):
+    """
+    Per-call wall times in seconds of func(item) for every item of
+    inputs, over repeat passes (after an untimed warm-up pass when
+    repeat > 1).
+    """
+    times = []
+    for _ in range(repeat + (repeat > 1)):
+        pass_times = []
+        for item in inputs:
+            start = time.perf_counter_ns()
+            func(item)
+            pass_times.append(time.perf_counter_ns() - start)
+        times.append(pass_times)
+    return np.array(times[1:] if repeat > 1 else times, dtype=np.float64).ravel() / 1e9
+
+
+def summarize(stage, times, samples=None, frames=None, sample_rate=None, buffer_size=None):
+    """
+    Suite record for one stage: per-call p50/p99 latency and, where the
+    stage consumes samples or yields frames, samples/s, frames/s and the
+    real-time factor (capture seconds processed per second).
+    """
+    total = times.sum()
+    return {
+        "stage": stage,
+        "sample_rate": sample_rate,
+        "buffer_size": buffer_size,
+        "calls": len(times),
+        "p50_ms": 1e3 * float(np.percentile(times, 50)),
+        "p99_ms": 1e3 * float(np.percentile(times, 99)),
+        "samples_per_second": samples / total if samples is not None else None,
+        "frames_per_second": frames / total if frames is not None else None,
+        "realtime_factor": samples / sample_rate / total if samples is not None and sample_rate else None,
+    }
+
+
+def suite_streaming(capture, buffer_size, sample_rate=RECEIVER_RATE, repeat=3):
+    """
+    The receive loop of safetcode.py buffer by buffer: the channelizer,
+    then one BurstDecoder per beacon channel (carrier detection while
+    idle, decoding once a burst is collected), and the two together.
+    Rates are in capture samples throughout; frames are those decoded.
+    """
+    buffers = [capture[i:i + buffer_size] for i in range(0, len(capture) - buffer_size + 1, buffer_size)]
+    samples = len(buffers) * buffer_size * repeat
+    channelizer = PolyphaseChannelizer(sample_rate)
+    channels = [channelizer.channel_index(frequency - RECEIVER_LO) for frequency in BEACON_CHANNELS_HZ]
+    streams = [channelizer.process(buffer) for buffer in buffers]
+
+    def receivers():
+        return [BurstDecoder(channelizer.output_rate, 0.6, detector_window=256) for _ in channels]
+
+    def decode(decoders, outputs):
+        return sum(len(decoder.push(outputs[channel]) or []) for channel, decoder in zip(channels, decoders))
+
+    counting = receivers()
+    frames = sum(decode(counting, outputs) for outputs in streams)
+    # Decoders carry their state from one timed pass to the next, as in the loop
+    decoders = receivers()
+    chain_channelizer, chain_decoders = PolyphaseChannelizer(sample_rate), receivers()
+
+    def record(stage, func, inputs, frames=None):
+        times = call_times(func, inputs, repeat)
+        return summarize(stage, times, samples, frames and frames * repeat, sample_rate, buffer_size)
+
+    return [
+        record("channelize", PolyphaseChannelizer(sample_rate).process, buffers),
+        record("BurstDecoder.push", lambda outputs: decode(decoders, outputs), streams, frames),
+        record("receive_loop", lambda buffer: decode(chain_decoders, chain_channelizer.process(buffer)), buffers,
+               frames),
+    ]
+
+
+def suite_frames(num_frames=64, repeat=3):
+    """
+    Per-frame stages: calculateBCH() over both protected fields and field
+    extraction (BCH check/correction and position decoding, as
+    extract_beacon_fields() does).
+    """
+    rng = np.random.default_rng(0)
+    packets = []
+    for _ in range(num_frames):
+        position = gps()
+        position.latitude, position.longitude = rng.uniform(-80, 80), rng.uniform(-170, 170)
+        packets.append(createPacket(position))
+
+    def bch(packet):
+        return calculateBCH(packet[24:85]), calculateBCH(packet[106:132])
+
+    def extract(packet):
+        frame = BeaconFrame.from_bits(packet).corrected()[0]
+        return frame.hex_id, decode_location(frame)
+
+    return [
+        summarize("calculateBCH", call_times(bch, packets, repeat), frames=num_frames * repeat),
+        summarize("extract_beacon_fields", call_times(extract, packets, repeat), frames=num_frames * repeat),
+    ]
+
+
+def suite_transmit(sample_rate, num_frames=8, repeat=3):
+    """
+    buildWaveform(), the work of transmitPacket(), per beacon.
+    """
+    rng = np.random.default_rng(0)
+    packets = []
+    for _ in range(num_frames):
+        position = gps()
+        position.latitude, position.longitude = rng.uniform(-80, 80), rng.uniform(-170, 170)
+        packets.append(createPacket(position))
+    samples_per_bit = int(sample_rate // 400)
+    times = call_times(lambda packet: buildWaveform(packet, 400, samples_per_bit), packets, repeat)
+    samples = len(buildWaveform(packets[0], 400, samples_per_bit)) * num_frames * repeat
+    return [summarize("transmitPacket", times, samples, num_frames * repeat, sample_rate)]
+
+
+def suite_chain(sample_rate, num_bursts=4, repeat=3):
+    """
+    The whole decode: decode_burst() on single-burst blocks (per-burst
+    latency) and decode_capture() over back-to-back bursts.
+    """
+    blocks = [synthetic_capture(1, sample_rate, seed=seed) for seed in range(num_bursts)]
+    capture = synthetic_capture(num_bursts, sample_rate)
+    frames = sum(len(decode_burst(block, sample_rate)) for block in blocks)
+    per_burst = call_times(lambda block: decode_burst(block, sample_rate), blocks, repeat)
+    decoded = len(decode_capture(capture, sample_rate))
+    whole = call_times(lambda iq: decode_capture(iq, sample_rate), [capture], repeat)
+    return [
+        summarize("decode_burst", per_burst, sum(map(len, blocks)) * repeat, frames * repeat, sample_rate),
+        summarize("decode_capture", whole, len(capture) * repeat, decoded * repeat, sample_rate, len(capture)),
+    ]
+
+
+def run_suite(sample_rates=(680000, 1000000), buffer_sizes=(4096, 16384, 65536), num_bursts=4, repeat=3):
+    """
+    Runs the receive loop stages at RECEIVER_RATE for every buffer size
+    and the transmit and chain stages at every sample rate. Returns the
+    records with the machine they ran on.
+    """
+    results = suite_frames(repeat=repeat)
+    # The channelizer needs a multiple of its channel spacing, so the receive loop runs at its own rate
+    offsets = [frequency - RECEIVER_LO for frequency in BEACON_CHANNELS_HZ]
+    capture = synthetic_capture(num_bursts, RECEIVER_RATE, snr_db=10.0, channels_hz=offsets).astype(np.complex64)
+    for buffer_size in buffer_sizes:
+        results += suite_streaming(capture, buffer_size, repeat=repeat)
+    for sample_rate in sample_rates:
+        results += suite_transmit(sample_rate, repeat=repeat)
+        results += suite_chain(sample_rate, num_bursts, repeat)
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "numba": HAVE_NUMBA,
+        "results": results,
+    }
+
+
+def print_suite(suite):
+    print(f"{'stage':<22s} {'rate':>8s} {'buffer':>8s} {'M samples/s':>12s} {'frames/s':>10s} "
+          f"{'p50 ms':>9s} {'p99 ms':>9s} {'x real time':>12s}")
+    for record in suite["results"]:
+        def column(key, width, scale=1.0, digits=3):
+            value = record[key]
+            return f"{value * scale:{width}.{digits}f}" if value is not None else " " * (width - 1) + "-"
+
+        rate = f"{record['sample_rate'] / 1e3:.0f}k" if record["sample_rate"] else "-"
+        print(f"{record['stage']:<22s} {rate:>8s} {record['buffer_size'] or '-':>8} "
+              f"{column('samples_per_second', 12, 1e-6)} {column('frames_per_second', 10, digits=1)} "
+              f"{column('p50_ms', 9)} {column('p99_ms', 9)} {column('realtime_factor', 12, digits=1)}")
+
+
+def print_rates(title, rates, unit="M/s", scale=1e6):
+    print(title)
+    baseline = next(iter(rates.values()))
+    for name, rate in rates.items():
+        print(f"  {name:<32s} {rate / scale:10.3f} {unit}  ({rate / baseline:7.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SAFE-T DSP throughput benchmarks")
+    parser.add_argument("--samples", type=int, default=1 << 16)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--suite", action="store_true", help="run the stage/chain suite instead of the comparisons")
+    parser.add_argument("--sample-rates", type=int, nargs="+", default=[680000, 1000000])
+    parser.add_argument("--buffer-sizes", type=int, nargs="+", default=[4096, 16384, 65536])
+    parser.add_argument("--bursts", type=int, default=4)
+    parser.add_argument("--json", help="write the suite results to this file")
+    args = parser.parse_args()
+
+    if args.suite or args.json:
+        suite = run_suite(args.sample_rates, args.buffer_sizes, args.bursts, args.repeat)
+        print_suite(suite)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(suite, f, indent=2)
+        raise SystemExit
+
+    print_rates(f"Carrier recovery, {args.samples} samples:", bench_costas(args.samples, args.repeat))
+    print_rates(f"Streaming demodulation, {args.samples} samples:", bench_streaming(args.samples, repeat=args.repeat))
+    print_rates(f"Decimated demodulation, {args.samples} samples:", bench_decimated(args.samples, repeat=args.repeat))
+    print_rates(f"Idle channel detection, {args.samples} samples:", bench_detector(args.samples, repeat=args.repeat))
+    print_rates(f"Channelizer, {args.samples} samples:", bench_channelizer(args.samples, repeat=args.repeat))
+    print_rates(f"Sync search, {args.samples // 4} bits:", bench_sync(args.samples // 4, args.repeat))
+    print_rates("Transmit waveform, one beacon at 680 kS/s:", bench_waveform(repeat=args.repeat))
+    print_rates("Batch decoding, 8 bursts at 680 kS/s:", bench_batch(repeat=args.repeat), "frames/s", 1)
+    print_rates("Pooled burst decoding, 8 bursts at 680 kS/s:", bench_pool(repeat=args.repeat), "frames/s", 1)
@@ -0,0 +1,118 @@
+# ===========================================
+# Gap-Free SDR Capture: Ring Buffer Between Radio and DSP
+# ===========================================
+
+import threading
+import time
+
+import numpy as np
+
+
+class SampleRing:
+    """
+    Single-producer/single-consumer ring of complex64 samples. The
+    producer only advances the write count and the consumer only the
+    read count, so neither side takes a lock; the event only wakes a
+    waiting consumer. When the consumer falls a full ring behind, new
+    blocks are dropped and counted rather than overwriting samples it
+    may be reading.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = int(capacity)
+        self._buffer = np.zeros(self.capacity, dtype=np.complex64)
+        self._written = 0
+        self._read = 0
+        self._ready = threading.Event()
+        self.overflows = 0
+        self.dropped = 0
+
+    @property
+    def available(self):
+        return self._written - self._read
+
+    def write(self, samples):
+        """
+        Producer side. Returns False if the block was dropped.
+        """
+        samples = np.asarray(samples)
+        n = len(samples)
+        if n > self.capacity - self.available:
+            self.overflows += 1
+            self.dropped += n
+            return False
+        start = self._written % self.capacity
+        first = min(n, self.capacity - start)
+        self._buffer[start:start + first] = samples[:first]
+        self._buffer[:n - first] = samples[first:]
+        self._written += n
+        self._ready.set()
+        return True
+
+    def read(self, max_samples=None, timeout=None):
+        """
+        Consumer side. Returns a copy of up to max_samples of the oldest
+        unread samples, waiting up to timeout seconds for data; the
+        result is empty if none arrived.
+        """
+        if self.available == 0:
+            self._ready.clear()
+            if self.available == 0:
+                self._ready.wait(timeout)
+        n = self.available
+        if max_samples is not None:
+            n = min(n, max_samples)
+        start = self._read % self.capacity
+        first = min(n, self.capacity - start)
+        out = np.concatenate([self._buffer[start:start + first], self._buffer[:n - first]])
+        self._read += n
+        return out
+
+    def clear(self):
+        """
+        Discards every unread sample. Only call it while no producer runs,
+        e.g. before starting a new CaptureThread on the ring.
+        """
+        self._read = self._written
+        self._ready.clear()
+
+
+class CaptureThread(threading.Thread):
+    """
+    Drains sdr.rx() into a SampleRing until stopped, so the radio keeps
+    being read while the DSP side is busy decoding. An exception from
+    the radio stops the thread and is kept in error. metrics, if given,
+    gets a "capture" time (sdr.rx() plus the ring write) per buffer.
+    """
+
+    def __init__(self, sdr, ring, metrics=None):
+        super().__init__(daemon=True)
+        self.sdr = sdr
+        self.ring = ring
+        self.metrics = metrics
+        self.buffers = 0
+        self.error = None
+        self._stop_event = threading.Event()
+
+    def run(self):
+        try:
+            while not self._stop_event.is_set():
+                start = time.perf_counter_ns()
+                samples = self.sdr.rx()
+                self.ring.write(samples)
+                self.buffers += 1
+                if self.metrics is not None:
+                    self.metrics.record("capture", time.perf_counter_ns() - start, len(samples))
+        except Exception as e:
+            self.error = e
+
+    def stop(self, timeout=1.0):
+        self._stop_event.set()
+        self.join(timeout)
+
+    def stats(self):
+        return {
+            "buffers": self.buffers,
+            "overflows": self.ring.overflows,
+            "dropped_samples": self.ring.dropped,
+        }
@@ -0,0 +1,94 @@
+# ===========================================
+# Polyphase FFT Channelizer for the 406 MHz Beacon Band
+# ===========================================
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Beacon channel centres, 3 kHz apart across 406.022-406.076 MHz
+CHANNEL_SPACING = 3000  # Hz
+BEACON_CHANNELS_HZ = tuple(406022000 + CHANNEL_SPACING * k for k in range(19))
+
+
+def prototype_filter(num_channels, taps_per_channel, bandwidth=1.0):
+    """
+    Hann-windowed sinc lowpass passing bandwidth channel spacings
+    (two-sided), normalised to unit DC gain.
+    """
+    length = num_channels * taps_per_channel
+    n = np.arange(length) - (length - 1) / 2
+    taps = np.sinc(bandwidth * n / num_channels) * np.hanning(length)
+    return taps / taps.sum()
+
+
+class PolyphaseChannelizer:
+    """
+    Splits a capture into num_channels = sample_rate / channel_spacing
+    channels, channel k centred k spacings above the tuned frequency
+    (indices past num_channels / 2 are below it), each decimated to
+    oversample * channel_spacing. Every output sample of every channel
+    comes from one pass of the polyphase filter (a product of the input
+    windows with the prototype taps) and one FFT across the branches, so
+    the work per input sample is taps_per_channel multiplies plus an FFT
+    share, however many channels are used. State carries across calls.
+    """
+
+    def __init__(self, sample_rate, channel_spacing=CHANNEL_SPACING, oversample=2, taps_per_channel=12, bandwidth=1.0):
+        num_channels = sample_rate / channel_spacing
+        if num_channels != int(num_channels) or int(num_channels) % oversample:
+            raise ValueError(
+                f"Sample rate {sample_rate} must be a multiple of {oversample} x {channel_spacing} Hz channel spacing"
+            )
+        self.sample_rate = float(sample_rate)
+        self.channel_spacing = channel_spacing
+        self.num_channels = int(num_channels)
+        self.decimation = self.num_channels // oversample
+        self.output_rate = self.sample_rate / self.decimation
+        self._length = self.num_channels * taps_per_channel
+
+        # Branch p of tap row k weights window sample k * M + p, so the taps are stored reversed
+        taps = prototype_filter(self.num_channels, taps_per_channel, bandwidth)
+        self._taps = taps[::-1].reshape(taps_per_channel, self.num_channels).astype(np.float32)
+
+        # Channel k of a window starting at sample s is rotated by exp(-2j pi k s / M);
+        # window starts step by the decimation, so the rotations repeat every oversample outputs
+        starts = np.arange(oversample) * self.decimation
+        self._rotation = np.exp(-2j * np.pi * np.outer(starts, np.arange(self.num_channels)) / self.num_channels)
+        self._rotation = self._rotation.astype(np.complex64)
+        self.reset()
+
+    def reset(self):
+        self._history = np.zeros(self._length - self.decimation, dtype=np.complex64)
+        # Start of the first window, in decimations modulo oversample (the history precedes sample 0)
+        self._phase = (self.decimation - self._length) // self.decimation % len(self._rotation)
+
+    def channel_index(self, offset_hz):
+        """
+        Channel index for a frequency offset (Hz) from the tuned frequency.
+        """
+        k = offset_hz / self.channel_spacing
+        if k != round(k) or abs(k) >= self.num_channels / 2:
+            raise ValueError(f"Offset {offset_hz} Hz is not a channel centre within the capture bandwidth")
+        return int(round(k)) % self.num_channels
+
+    def process(self, samples):
+        """
+        Returns a (num_channels, n) complex64 array of channel outputs for
+        this buffer, n being the number of whole decimation steps it adds.
+        """
+        buffer = np.concatenate([self._history, np.asarray(samples, dtype=np.complex64)])
+        count = (len(buffer) - self._length) // self.decimation + 1
+        if count <= 0:
+            self._history = buffer
+            return np.zeros((self.num_channels, 0), dtype=np.complex64)
+
+        windows = sliding_window_view(buffer, self._length)[::self.decimation][:count]
+        branches = np.einsum("nkp,kp->np", windows.reshape(count, -1, self.num_channels), self._taps)
+        outputs = np.fft.fft(branches, axis=1).astype(np.complex64)
+
+        rows = (self._phase + np.arange(count)) % len(self._rotation)
+        outputs *= self._rotation[rows]
+
+        self._phase = (self._phase + count) % len(self._rotation)
+        self._history = buffer[count * self.decimation:]
+        return outputs.T
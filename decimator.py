@@ -0,0 +1,89 @@
+# ===========================================
+# Multistage CIC/Half-Band Decimation Ahead of the Demodulator
+# ===========================================
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def cic_taps(factor, order):
+    """
+    Impulse response of an order-N CIC decimator (N cascaded length-R
+    boxcars), normalised to unit DC gain.
+    """
+    taps = np.ones(1)
+    for _ in range(order):
+        taps = np.convolve(taps, np.ones(factor))
+    return taps / taps.sum()
+
+
+def halfband_taps(num_taps=19):
+    """
+    Hamming-windowed half-band lowpass (cutoff at a quarter of the input
+    rate); every other tap except the centre one is zero.
+    """
+    n = np.arange(num_taps) - (num_taps - 1) / 2
+    taps = np.sinc(n / 2) * np.hamming(num_taps)
+    return taps / taps.sum()
+
+
+class FirDecimator:
+    """
+    Streaming FIR filter followed by decimation by factor. Only every
+    factor-th output is computed, as one matrix product of the input
+    windows with the taps. State carries across calls.
+    """
+
+    def __init__(self, taps, factor):
+        self.factor = int(factor)
+        self._taps = np.asarray(taps, dtype=np.float32)[::-1].copy()
+        self.reset()
+
+    def reset(self):
+        self._history = np.zeros(len(self._taps) - 1, dtype=np.complex64)
+
+    def process(self, samples):
+        buffer = np.concatenate([self._history, np.asarray(samples, dtype=np.complex64)])
+        count = (len(buffer) - len(self._taps)) // self.factor + 1
+        if count <= 0:
+            self._history = buffer
+            return np.zeros(0, dtype=np.complex64)
+        windows = sliding_window_view(buffer, len(self._taps))[::self.factor][:count]
+        self._history = buffer[count * self.factor:]
+        return windows @ self._taps
+
+
+class DecimationChain:
+    """
+    CIC stage followed by half-band stages that bring sample_rate down to
+    about samples_per_symbol samples per bit. The CIC factor is chosen
+    from the actual sample rate, and the resulting (generally fractional)
+    samples_per_symbol is exposed for the demodulator. The output band
+    (+/- output_rate / 2) must hold the burst plus its carrier offset.
+    """
+
+    def __init__(self, sample_rate, bit_rate=400, samples_per_symbol=16, halfband_stages=2, cic_order=4):
+        self.sample_rate = float(sample_rate)
+        cic_factor = int(self.sample_rate // (bit_rate * samples_per_symbol * 2 ** halfband_stages))
+        while cic_factor < 1 and halfband_stages > 0:
+            halfband_stages -= 1
+            cic_factor = int(self.sample_rate // (bit_rate * samples_per_symbol * 2 ** halfband_stages))
+        cic_factor = max(cic_factor, 1)
+
+        self.stages = []
+        if cic_factor > 1:
+            self.stages.append(FirDecimator(cic_taps(cic_factor, cic_order), cic_factor))
+        self.stages += [FirDecimator(halfband_taps(), 2) for _ in range(halfband_stages)]
+
+        self.factor = cic_factor * 2 ** halfband_stages
+        self.output_rate = self.sample_rate / self.factor
+        self.samples_per_symbol = self.output_rate / bit_rate
+
+    def reset(self):
+        for stage in self.stages:
+            stage.reset()
+
+    def process(self, samples):
+        for stage in self.stages:
+            samples = stage.process(samples)
+        return np.asarray(samples, dtype=np.complex64)
@@ -0,0 +1,173 @@
+# ===========================================
+# Multi-Process Burst Decoding over Shared Memory
+# ===========================================
+
+import multiprocessing as mp
+import os
+import queue
+import signal
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from batch_decode import decode_bursts
+from metrics import StageLog
+
+
+def decode_burst(samples, sample_rate):
+    """
+    Default worker task: (frame value, quality) of every beacon in a
+    block, quality as decode_bursts() gives it.
+    """
+    return [(frame.value, quality) for _, frame, quality in decode_bursts(samples, sample_rate)]
+
+
+def decode_burst_timed(samples, sample_rate):
+    """
+    decode_burst() plus its decode_bursts() stage times: (frames,
+    StageLog records) for Metrics.replay() in the parent.
+    """
+    log = StageLog()
+    frames = [(frame.value, quality) for _, frame, quality in decode_bursts(samples, sample_rate, metrics=log)]
+    return frames, log.records
+
+
+def _worker(shm, shape, decode, tasks, results):
+    """
+    Decodes blocks straight out of the shared slots until a None task.
+    Ctrl-C is left to the parent, which shuts the pool down.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    slots = np.ndarray(shape, dtype=np.complex64, buffer=shm.buf)
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            seq, slot, length, sample_rate = task
+            try:
+                payload = decode(slots[slot, :length], sample_rate)
+            except Exception as e:
+                payload = e
+            results.put((seq, slot, payload))
+    finally:
+        del slots
+        shm.close()
+
+
+class DecodePool:
+    """
+    Fans sample blocks (one burst each) out to worker processes. Blocks
+    are copied into slots of one shared memory segment, so only
+    (sequence, slot, length) crosses the task queue and no IQ data is
+    pickled. A slot is reused once its result is back; submit() blocks
+    while every slot is busy. Results come out of ready() in submission
+    order, whichever worker finishes first.
+    """
+
+    def __init__(self, slot_samples, num_workers=None, num_slots=None, decode=decode_burst):
+        self.num_workers = num_workers or os.cpu_count() or 1
+        num_slots = num_slots or 2 * self.num_workers
+        self.slot_samples = int(slot_samples)
+
+        shape = (num_slots, self.slot_samples)
+        self._shm = shared_memory.SharedMemory(create=True, size=num_slots * self.slot_samples * 8)
+        self._slots = np.ndarray(shape, dtype=np.complex64, buffer=self._shm.buf)
+        self._free = list(range(num_slots))
+        self._tasks = mp.Queue()
+        self._results = mp.Queue()
+        self._workers = [
+            mp.Process(target=_worker, args=(self._shm, shape, decode, self._tasks, self._results), daemon=True)
+            for _ in range(self.num_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+        self._next_seq = 0
+        self._next_result = 0
+        self._done = {}
+
+    @property
+    def outstanding(self):
+        return self._next_seq - self._next_result
+
+    def _collect(self, timeout=0.0):
+        """
+        Moves one finished result into the reorder buffer. Returns False on timeout.
+        """
+        try:
+            seq, slot, payload = self._results.get(timeout=timeout) if timeout else self._results.get_nowait()
+        except queue.Empty:
+            return False
+        self._free.append(slot)
+        self._done[seq] = payload
+        return True
+
+    def submit(self, samples, sample_rate):
+        """
+        Queues one block and returns its sequence number. Blocks longer
+        than a slot are truncated.
+        """
+        while not self._free:
+            self._collect(timeout=0.1)
+        slot = self._free.pop()
+        length = min(len(samples), self.slot_samples)
+        self._slots[slot, :length] = samples[:length]
+
+        seq = self._next_seq
+        self._next_seq += 1
+        self._tasks.put((seq, slot, length, sample_rate))
+        return seq
+
+    def ready(self, timeout=0.0):
+        """
+        Yields (sequence, result) for every block finished so far, in
+        submission order. The result is whatever the decode function
+        returned, or the exception it raised. With a timeout, waits up to
+        that long for the next result in order.
+        """
+        while self._collect():
+            pass
+        if timeout and self._next_result not in self._done and self.outstanding:
+            while self._collect(timeout) and self._next_result not in self._done:
+                pass
+        while self._next_result in self._done:
+            seq = self._next_result
+            self._next_result += 1
+            yield seq, self._done.pop(seq)
+
+    def close(self):
+        """
+        Stops the workers and releases the shared memory segment.
+        Outstanding results are discarded. If interrupted (a second
+        Ctrl-C), the workers are terminated instead of waited for, and
+        the segment is released all the same. Calling it again does
+        nothing.
+        """
+        if self._shm is None:
+            return
+        try:
+            for _ in self._workers:
+                self._tasks.put(None)
+            # Keep reading results so no worker blocks on a full pipe while exiting
+            while any(worker.is_alive() for worker in self._workers) and self._collect(timeout=5.0):
+                pass
+            for worker in self._workers:
+                worker.join(timeout=5.0)
+        finally:
+            for worker in self._workers:
+                if worker.is_alive():
+                    worker.terminate()
+            # Unread tasks or results must not hold up interpreter exit
+            self._tasks.cancel_join_thread()
+            self._results.cancel_join_thread()
+            del self._slots
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,283 @@
+# ===========================================
+# SQLite Detection Store: Every Decoded Frame, Indexed by ID, Time and Place
+# ===========================================
+
+import argparse
+import csv
+import math
+import os
+import sqlite3
+import sys
+import time
+from contextlib import closing
+from datetime import datetime, timezone
+from itertools import islice
+
+from kml_writer import KML_FOOTER, KML_HEADER
+
+# Grid cells are CELL_DEGREES squares numbered row by row from (-90, -180)
+CELL_DEGREES = 1.0
+CELL_COLUMNS = math.ceil(360 / CELL_DEGREES)
+# Boxes covering more cells than this are searched by time alone
+MAX_QUERY_CELLS = 4096
+
+COLUMNS = ("time", "hex_id", "country_code", "location_hex", "latitude", "longitude", "cell", "frame",
+           "cfo_hz", "snr_db", "corrected_bits", "sync_errors")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS detections (
+    id INTEGER PRIMARY KEY,
+    time REAL NOT NULL,
+    hex_id TEXT NOT NULL,
+    country_code INTEGER,
+    location_hex TEXT,
+    latitude REAL,
+    longitude REAL,
+    cell INTEGER,
+    frame BLOB,
+    cfo_hz REAL,
+    snr_db REAL,
+    corrected_bits INTEGER,
+    sync_errors INTEGER
+);
+CREATE INDEX IF NOT EXISTS detections_hex_id ON detections (hex_id, time);
+CREATE INDEX IF NOT EXISTS detections_time ON detections (time);
+CREATE INDEX IF NOT EXISTS detections_cell ON detections (cell, time);
+"""
+
+
+def grid_cell(latitude, longitude):
+    """
+    Number of the CELL_DEGREES grid cell holding a position.
+    """
+    row = min(int((latitude + 90) // CELL_DEGREES), math.ceil(180 / CELL_DEGREES) - 1)
+    column = int(((longitude + 180) % 360) // CELL_DEGREES)
+    return row * CELL_COLUMNS + column
+
+
+def box_cells(south, west, north, east):
+    """
+    Cells overlapping a box; west > east is a box across the antimeridian.
+    """
+    first, last = grid_cell(south, west), grid_cell(north, east)
+    rows = range(first // CELL_COLUMNS, last // CELL_COLUMNS + 1)
+    west_column = first % CELL_COLUMNS
+    east_column = min(int((east + 180) // CELL_DEGREES), CELL_COLUMNS - 1)
+    if west <= east:
+        columns = range(west_column, east_column + 1)
+    else:
+        columns = [*range(west_column, CELL_COLUMNS), *range(0, east_column + 1)]
+    return [row * CELL_COLUMNS + column for row in rows for column in columns]
+
+
+def _epoch(value):
+    if value is None:
+        return time.time()
+    if isinstance(value, str):
+        return datetime.fromisoformat(value).timestamp()
+    return float(value)
+
+
+def _iso(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc).isoformat(timespec="milliseconds")
+
+
+class DetectionStore:
+    """
+    Every decoded frame in one SQLite file: the 144 raw bits, decoded
+    fields, carrier offset, SNR and time. The database runs in WAL mode
+    with synchronous=NORMAL, so readers (an export) never block the
+    writer and a commit costs no fsync; insert() writes batch_size rows
+    per transaction. Detections are indexed by (hex_id, time), time and
+    (grid cell, time), so query() over a box and a time window only
+    touches the matching rows.
+    """
+
+    def __init__(self, path="detections.db", batch_size=1024):
+        self.path = path
+        self.batch_size = batch_size
+        # Opened here, then used by one writer thread at a time
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._insert = f"INSERT INTO detections ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+
+    @staticmethod
+    def row(record):
+        """
+        Table row for one record: extract_beacon_fields() fields plus time
+        (ISO string or Unix seconds) and optionally frame (hex), cfo_hz,
+        snr_db, corrected_bits and sync_errors.
+        """
+        latitude, longitude = record.get("latitude"), record.get("longitude")
+        cell = grid_cell(latitude, longitude) if latitude is not None and longitude is not None else None
+        frame = record.get("frame")
+        return (
+            _epoch(record.get("time")), record["hex_id"], record.get("country_code"), record.get("location_hex"),
+            latitude, longitude, cell, bytes.fromhex(frame) if frame else None,
+            record.get("cfo_hz"), record.get("snr_db"), record.get("corrected_bits", record.get("bch_corrected")),
+            record.get("sync_errors"),
+        )
+
+    def insert(self, records):
+        """
+        Stores the records, batch_size per transaction. Returns the count.
+        """
+        records = iter(records)
+        count = 0
+        while True:
+            rows = [self.row(record) for record in islice(records, self.batch_size)]
+            if not rows:
+                return count
+            with self._conn:
+                self._conn.executemany(self._insert, rows)
+            count += len(rows)
+
+    def query(self, box=None, since=None, until=None, hex_id=None):
+        """
+        Yields detections (dicts, frame as hex, time as Unix seconds) in
+        time order, straight off the cursor. box is (south, west, north,
+        east) in degrees; since and until are Unix seconds.
+        """
+        where, params = [], []
+        if hex_id is not None:
+            where.append("hex_id = ?")
+            params.append(hex_id)
+        if since is not None:
+            where.append("time >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("time < ?")
+            params.append(until)
+        if box is not None:
+            south, west, north, east = box
+            cells = box_cells(*box)
+            if len(cells) <= MAX_QUERY_CELLS:
+                where.append(f"cell IN ({', '.join(map(str, cells))})")
+            where.append("latitude BETWEEN ? AND ?")
+            params += [south, north]
+            where.append("(longitude >= ? AND longitude <= ?)" if west <= east else "(longitude >= ? OR longitude <= ?)")
+            params += [west, east]
+
+        sql = f"SELECT {', '.join(COLUMNS[:-5])}, hex(frame) AS frame, {', '.join(COLUMNS[-4:])} FROM detections"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        for row in self._conn.execute(sql + " ORDER BY time", params):
+            yield dict(row)
+
+    def count(self):
+        return self._conn.execute("SELECT count(*) FROM detections").fetchone()[0]
+
+    def checkpoint(self):
+        """
+        Copies the WAL into the database file (fsynced), keeping the WAL short.
+        """
+        self._conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def close(self):
+        self.checkpoint()
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def export_csv(detections, stream):
+    writer = csv.DictWriter(stream, fieldnames=[column for column in COLUMNS if column != "cell"], extrasaction="ignore")
+    writer.writeheader()
+    count = 0
+    for detection in detections:
+        writer.writerow(dict(detection, time=_iso(detection["time"])))
+        count += 1
+    return count
+
+
+def export_kml(detections, stream):
+    """
+    One timestamped point placemark per detection, written as it comes.
+    """
+    stream.write(KML_HEADER.decode())
+    count = 0
+    for detection in detections:
+        if detection["latitude"] is None:
+            continue
+        stream.write(f"""<Placemark>
+    <name>Beacon {detection['hex_id']}</name>
+    <TimeStamp><when>{_iso(detection['time'])}</when></TimeStamp>
+    <description>
+        Country Code: {detection['country_code']}
+        Encoded Location: {detection['location_hex']}
+        CFO: {detection['cfo_hz']} Hz
+        SNR: {detection['snr_db']} dB
+    </description>
+    <Point><coordinates>{detection['longitude']},{detection['latitude']},0</coordinates></Point>
+</Placemark>
+""")
+        count += 1
+    stream.write(KML_FOOTER.decode())
+    return count
+
+
+def import_recording(store, path, fmt=None, sample_rate=None):
+    """
+    Decodes a recording into the store, timed from its start_time.
+    """
+    from recording import decode_recording, read_metadata
+    from location import decode_location
+
+    metadata = read_metadata(path, fmt, sample_rate)
+    started = _epoch(metadata["start_time"]) if "start_time" in metadata else os.path.getmtime(path)
+
+    def records():
+        for seconds, frame, quality in decode_recording(path, fmt=fmt, sample_rate=sample_rate):
+            latitude, longitude = decode_location(frame)
+            yield dict(quality, time=started + seconds, hex_id=frame.hex_id, country_code=frame.country_code,
+                       location_hex=f"{frame.location:05X}", latitude=latitude, longitude=longitude,
+                       frame=frame.to_bytes().hex())
+
+    return store.insert(records())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query or fill a detection database")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="stream detections to KML or CSV")
+    export.add_argument("db")
+    export.add_argument("--format", choices=("kml", "csv"), default="kml")
+    export.add_argument("--box", type=float, nargs=4, metavar=("SOUTH", "WEST", "NORTH", "EAST"))
+    export.add_argument("--hours", type=float, help="only the last this many hours")
+    export.add_argument("--hex-id")
+    export.add_argument("-o", "--output", help="output file (default stdout)")
+
+    load = commands.add_parser("import", help="decode a recording into the database")
+    load.add_argument("db")
+    load.add_argument("recording")
+    load.add_argument("--format")
+    load.add_argument("--sample-rate", type=float)
+
+    args = parser.parse_args()
+
+    with DetectionStore(args.db) as store:
+        started = time.perf_counter()
+        if args.command == "export":
+            since = time.time() - 3600 * args.hours if args.hours is not None else None
+            write = export_kml if args.format == "kml" else export_csv
+            # Closed before the store, so an interrupted export leaves no statement open
+            with closing(store.query(args.box, since, hex_id=args.hex_id)) as detections:
+                if args.output:
+                    with open(args.output, "w", newline="", encoding="utf-8") as f:
+                        count = write(detections, f)
+                else:
+                    count = write(detections, sys.stdout)
+            action = "Exported"
+        else:
+            count = import_recording(store, args.recording, args.format, args.sample_rate)
+            action = "Imported"
+        elapsed = time.perf_counter() - started
+        print(f"{action} {count} detections in {1e3 * elapsed:.1f} ms", file=sys.stderr)
@@ -0,0 +1,159 @@
+# ===========================================
+# Filter Bank: Cached Pulse-Shaping Taps and Fast Convolution
+# ===========================================
+
+import math
+from functools import lru_cache
+
+import numpy as np
+from commpy.filters import rcosfilter
+
+# numpy >= 2.0 can write FFT results into caller-provided arrays
+try:
+    np.fft.fft(np.zeros(2, dtype=np.complex128), out=np.empty(2, dtype=np.complex128))
+    _FFT_HAS_OUT = True
+except TypeError:
+    _FFT_HAS_OUT = False
+
+# Taps below this length are always filtered directly
+DIRECT_MAX_TAPS = 32
+
+
+@lru_cache(maxsize=32)
+def cached_rcosfilter(num_taps, alpha, Ts, Fs):
+    """
+    rcosfilter() taps, computed once per parameter set.
+    The returned array is shared between callers and marked read-only.
+    """
+    _, taps = rcosfilter(num_taps, alpha, Ts, Fs)
+    taps.setflags(write=False)
+    return taps
+
+
+def rrc_taps(span, beta, samples_per_symbol):
+    """
+    Matched filter taps for a (span, beta, sps) triple, as used by the demodulator.
+    """
+    return cached_rcosfilter(int(round(span * samples_per_symbol)), beta, 1.0, samples_per_symbol)
+
+
+def next_pow2(n):
+    return 1 << max(int(n) - 1, 0).bit_length()
+
+
+def use_fft(num_samples, num_taps, nfft=None):
+    """
+    Rough operation-count comparison between direct and FFT convolution.
+    """
+    if num_taps <= DIRECT_MAX_TAPS or num_samples == 0:
+        return False
+    if nfft is None:
+        nfft = next_pow2(num_samples + num_taps - 1)
+    blocks = math.ceil(num_samples / (nfft - num_taps + 1))
+    fft_cost = blocks * (2 * nfft * math.log2(nfft) + nfft)
+    return fft_cost < num_samples * num_taps
+
+
+def convolve(signal, taps, mode='full'):
+    """
+    Drop-in replacement for np.convolve that switches to an FFT for long taps.
+    """
+    signal = np.asarray(signal)
+    taps = np.asarray(taps)
+    n, m = len(signal), len(taps)
+    if not use_fft(max(n, m), min(n, m)):
+        return np.convolve(signal, taps, mode=mode)
+
+    nfft = next_pow2(n + m - 1)
+    full = np.fft.ifft(np.fft.fft(signal, nfft) * np.fft.fft(taps, nfft))[:n + m - 1]
+    if not (np.iscomplexobj(signal) or np.iscomplexobj(taps)):
+        full = full.real
+
+    if mode == 'full':
+        return full
+    if mode == 'same':
+        length = max(n, m)
+        start = (min(n, m) - 1) // 2
+        return full[start:start + length]
+    if mode == 'valid':
+        return full[min(n, m) - 1:max(n, m)]
+    raise ValueError(f"Unknown convolution mode: {mode}")
+
+
+class OverlapSaveFilter:
+    """
+    Streaming FIR filter. Output sample k of each call only depends on input
+    up to k, and the last len(taps) - 1 inputs are carried to the next call.
+    The FFT of the taps and all scratch buffers are built once in __init__.
+    """
+
+    def __init__(self, taps, block_size=4096):
+        self.taps = np.asarray(taps, dtype=np.complex128)
+        self.num_taps = len(self.taps)
+        self.nfft = next_pow2(self.num_taps - 1 + block_size)
+        self.step = self.nfft - self.num_taps + 1
+
+        self._history = np.zeros(self.num_taps - 1, dtype=np.complex128)
+        self._direct_buf = np.zeros(self.num_taps - 1 + block_size, dtype=np.complex128)
+        self._fft_buf = np.zeros(self.nfft, dtype=np.complex128)
+        self._spectrum = np.empty(self.nfft, dtype=np.complex128)
+        self._taps_spectrum = np.fft.fft(self.taps, self.nfft)
+
+    def reset(self):
+        self._history[:] = 0
+
+    def _fft_segment(self, segment, out):
+        m = self.num_taps - 1
+        n = len(segment)
+        buf = self._fft_buf
+        buf[:m] = self._history
+        buf[m:m + n] = segment
+        buf[m + n:] = 0  # stale samples would not alias, but they inflate FFT rounding
+        if _FFT_HAS_OUT:
+            np.fft.fft(buf, out=self._spectrum)
+            self._spectrum *= self._taps_spectrum
+            np.fft.ifft(self._spectrum, out=buf)
+        else:
+            buf[:] = np.fft.ifft(np.fft.fft(buf) * self._taps_spectrum)
+        out[:] = buf[m:m + n]
+
+    def _direct_segment(self, segment, out):
+        m = self.num_taps - 1
+        n = len(segment)
+        if len(self._direct_buf) < m + n:
+            self._direct_buf = np.zeros(m + n, dtype=np.complex128)
+        buf = self._direct_buf[:m + n]
+        buf[:m] = self._history
+        buf[m:] = segment
+        out[:] = np.convolve(buf, self.taps, mode='valid')
+
+    def _update_history(self, signal):
+        m = self.num_taps - 1
+        if m == 0:
+            return
+        if len(signal) >= m:
+            self._history[:] = signal[len(signal) - m:]
+        else:
+            self._history[:m - len(signal)] = self._history[len(signal):]
+            self._history[m - len(signal):] = signal
+
+    def process(self, signal, out=None):
+        """
+        Filters one block; returns as many output samples as input samples.
+        Pass a preallocated out array to avoid per-call allocations.
+        """
+        signal = np.asarray(signal)
+        n = len(signal)
+        if out is None:
+            out = np.empty(n, dtype=np.complex128)
+        out = out[:n]
+
+        if use_fft(n, self.num_taps, self.nfft):
+            for start in range(0, n, self.step):
+                stop = min(start + self.step, n)
+                self._fft_segment(signal[start:stop], out[start:stop])
+                self._update_history(signal[start:stop])
+        else:
+            self._direct_segment(signal, out)
+            self._update_history(signal)
+        return out
@@ -0,0 +1,41 @@
+# ===========================================
+# Frame Synchronization: Vectorized Sync-Word Search
+# ===========================================
+
+import numpy as np
+
+# Bit and frame synchronization as emitted by createPacket() in Test_Beacon.py
+BIT_SYNC = np.ones(15, dtype=np.uint8)
+FRAME_SYNC = np.array([0, 0, 0, 1, 0, 1, 1, 1, 1], dtype=np.uint8)
+BEACON_SYNC = np.concatenate([BIT_SYNC, FRAME_SYNC])
+
+
+def sync_distances(bits, pattern):
+    """
+    Hamming distance between the pattern and the bitstream at every offset.
+    Both are mapped to +/-1, so one correlation gives all distances:
+    distance = (len(pattern) - correlation) / 2.
+    """
+    bits = np.asarray(bits, dtype=np.int16)
+    pattern = np.asarray(pattern, dtype=np.int16)
+    if len(bits) < len(pattern):
+        return np.zeros(0, dtype=np.int16)
+    correlation = np.correlate(2 * bits - 1, 2 * pattern - 1, mode='valid')
+    return (len(pattern) - correlation) // 2
+
+
+def find_sync_candidates(bits, pattern=BEACON_SYNC, max_distance=4, allow_inverted=False):
+    """
+    Returns (offsets, distances, inverted) for every offset where the
+    pattern matches within max_distance bit errors, in stream order.
+    With allow_inverted, offsets where the complement of the pattern
+    matches are reported too (180 degree carrier phase ambiguity).
+    """
+    distances = sync_distances(bits, pattern)
+    inverted = np.zeros(len(distances), dtype=bool)
+    if allow_inverted:
+        flipped = len(pattern) - distances
+        inverted = flipped < distances
+        distances = np.minimum(distances, flipped)
+    offsets = np.flatnonzero(distances <= max_distance)
+    return offsets, distances[offsets], inverted[offsets]
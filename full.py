@@ -2,15 +2,18 @@
 # PART 5: Main Execution Loop with GPIO Switch & LED Feedback
 # ===========================================
 
-import RPi.GPIO as GPIO
-import board
-import neopixel
+import signal
 import time
 
-# LED Setup
+from beacon_index import BeaconIndex, decode_confidence
+from capture import CaptureThread, SampleRing
+from channelizer import BEACON_CHANNELS_HZ, PolyphaseChannelizer
+from hardware import LedStrip, RockerSwitch
+from streaming import BurstDecoder
+
+# LED Setup (disabled where board/neopixel are unavailable)
 LED_COUNT = 7
-LED_PIN = board.D18
-pixels = neopixel.NeoPixel(LED_PIN, LED_COUNT, brightness=0.3, auto_write=False)
+pixels = LedStrip(LED_COUNT, brightness=0.3)
 
 def flash_green():
     pixels.fill((0, 255, 0))
@@ -19,44 +22,94 @@ def flash_green():
     pixels.fill((0, 0, 0))
     pixels.show()
 
-# GPIO Setup
+# GPIO Setup (simulated as always on where RPi.GPIO is unavailable)
 SWITCH_PIN = 23  # GPIO 23
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(SWITCH_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+switch = RockerSwitch(SWITCH_PIN)
+
+# KML, JSON lines and terminal output, written off the decode loop
+beacon_log = open_beacon_log()
+detection_log = open_detection_store()
+
+# Repeats of a known beacon update its track instead of being shown and logged again
+BEACON_TTL = 600.0
+beacon_index = BeaconIndex(BEACON_TTL)
 
-# KML Log
-kml_path = init_kml_log()
+# Seconds each channel collects after its carrier detector fires, and held in the capture ring
+BURST_HOLD = 0.6
+RING_SECONDS = 4.0
+
+capture = None
 
 # Main Loop
 try:
     print("SAFE-T System Ready. Flip switch to start.")
     while True:
-        if GPIO.input(SWITCH_PIN) == GPIO.LOW:
+        if switch.is_on():
             print("📡 STARTING SIGNAL MONITORING...")
             time.sleep(1)  # debounce delay
 
-            while GPIO.input(SWITCH_PIN) == GPIO.LOW:
-                raw_samples = sdr.rx()
-                bits = bpsk_demodulate(raw_samples, samples_per_symbol=20)
-                
-                if len(bits) >= 144:
-                    try:
-                        beacon_info = extract_beacon_fields(bits)
-                        display_beacon_info(beacon_info)
-                        log_beacon_to_kml(kml_path, beacon_info)
-                        flash_green()
-                        time.sleep(15)  # SARSAT beacon transmits every 15 seconds
-                    except Exception as e:
-                        print("⚠️ Error decoding beacon:", e)
-                else:
-                    print("...Listening, no valid packet detected")
-                time.sleep(0.5)
+            channelizer = PolyphaseChannelizer(sdr.sample_rate)
+            offsets = [frequency - sdr.rx_lo for frequency in BEACON_CHANNELS_HZ]
+            channels = [channelizer.channel_index(offset) for offset in offsets]
+            receivers = [
+                BurstDecoder(channelizer.output_rate, BURST_HOLD, detector_window=256, max_sync_errors=MAX_SYNC_ERRORS,
+                             metrics=metrics)
+                for _ in channels
+            ]
+
+            ring = SampleRing(RING_SECONDS * sdr.sample_rate)
+            capture = CaptureThread(sdr, ring, metrics)
+            capture.start()
+
+            while switch.is_on():
+                if capture.error is not None:
+                    raise capture.error
+                raw_samples = ring.read(16 * sdr.rx_buffer_size, timeout=0.5)
+                if len(raw_samples) == 0:
+                    continue
+                with metrics.time("channelize", len(raw_samples)):
+                    streams = channelizer.process(raw_samples)
+
+                for channel, offset, receiver in zip(channels, offsets, receivers):
+                    decoded = receiver.push(streams[channel])
+                    if decoded is None:
+                        continue
+                    metrics.count("bursts")
+                    if not decoded:
+                        metrics.count("frames_rejected")
+
+                    for frame, quality in decoded:
+                        try:
+                            beacon_info = extract_beacon_fields(frame, quality["corrected_bits"])
+                        except ValueError:
+                            metrics.count("frames_rejected")
+                            continue
+                        metrics.count("frames")
+                        detection_log.log(dict(beacon_info, **dict(quality, cfo_hz=offset + quality["cfo_hz"])))
+                        confidence = decode_confidence(quality["corrected_bits"], quality["sync_errors"])
+                        track, changed = beacon_index.update(beacon_info, confidence)
+                        if changed:
+                            beacon_log.log(track.summary())
+                            flash_green()
+                        else:
+                            metrics.count("repeats")
+
+            capture.stop()
+            capture = None
+            print(metrics.summary())
 
         time.sleep(0.1)  # idle loop delay
 
 except KeyboardInterrupt:
     print("\n🛑 Exiting... Cleaning up.")
-    finalize_kml_log(kml_path)
-    GPIO.cleanup()
+finally:
+    # Every step below has a timeout, and a second Ctrl-C must not cut it short
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if capture is not None:
+        capture.stop()
+    print(metrics.summary())
+    beacon_log.close()
+    detection_log.close()
+    switch.cleanup()
     pixels.fill((0, 0, 0))
     pixels.show()
@@ -0,0 +1,72 @@
+# ===========================================
+# Raspberry Pi Switch and LEDs, Imported Only Where Present
+# ===========================================
+
+import warnings
+
+
+class RockerSwitch:
+    """
+    Rocker switch between a BCM pin and ground, read through the internal
+    pull-up (LOW = on). RPi.GPIO is imported here rather than by the
+    scripts; without it (simulation on a desktop) the switch reads as
+    permanently on.
+    """
+
+    def __init__(self, pin):
+        self.pin = pin
+        try:
+            import RPi.GPIO as GPIO
+            GPIO.setmode(GPIO.BCM)
+            GPIO.setup(pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+        except (ImportError, RuntimeError):
+            warnings.warn("RPi.GPIO unavailable, rocker switch simulated as on")
+            GPIO = None
+        self._gpio = GPIO
+
+    @property
+    def simulated(self):
+        return self._gpio is None
+
+    def is_on(self):
+        return self._gpio is None or self._gpio.input(self.pin) == self._gpio.LOW
+
+    def on_toggle(self, callback, bouncetime=500):
+        """
+        Calls callback(pin) on every press. A simulated switch is pressed once, now.
+        """
+        if self._gpio is None:
+            callback(self.pin)
+        else:
+            self._gpio.add_event_detect(self.pin, self._gpio.FALLING, callback=callback, bouncetime=bouncetime)
+
+    def cleanup(self):
+        if self._gpio is not None:
+            self._gpio.cleanup()
+
+
+class LedStrip:
+    """
+    NeoPixel strip on GPIO18 with the fill()/show() calls the scripts use.
+    Without board/neopixel the calls do nothing.
+    """
+
+    def __init__(self, count=7, brightness=0.2):
+        try:
+            import board
+            import neopixel
+            self._pixels = neopixel.NeoPixel(
+                board.D18, count, brightness=brightness,
+                auto_write=False, pixel_order=neopixel.GRB
+            )
+        except (ImportError, NotImplementedError, RuntimeError):
+            warnings.warn("neopixel unavailable, LEDs disabled")
+            self._pixels = None
+
+    def fill(self, color):
+        if self._pixels is not None:
+            self._pixels.fill(color)
+
+    def show(self):
+        if self._pixels is not None:
+            self._pixels.show()
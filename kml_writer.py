@@ -0,0 +1,138 @@
+# ===========================================
+# Always-Valid KML Beacon Map with Tracks and KMZ Rotation
+# ===========================================
+
+import os
+import time
+import zipfile
+from collections import OrderedDict, deque
+
+KML_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<kml xmlns="http://www.opengis.net/kml/2.2" xmlns:gx="http://www.google.com/kml/ext/2.2">\n'
+    '<Document>\n'
+).encode()
+KML_FOOTER = b'</Document>\n</kml>\n'
+
+
+class KmlTrack:
+    """
+    Detections of one hex_id, newest last, kept to max_points.
+    """
+
+    def __init__(self, hex_id, max_points=1000):
+        self.hex_id = hex_id
+        self.points = deque(maxlen=max_points)
+        self.detections = 0
+        self.last = None
+
+    def add(self, record):
+        self.points.append((record["time"], record["longitude"], record["latitude"]))
+        self.detections += 1
+        self.last = record
+
+    def kml(self):
+        whens = "".join(f"        <when>{when}</when>\n" for when, _, _ in self.points)
+        coords = "".join(f"        <gx:coord>{lon} {lat} 0</gx:coord>\n" for _, lon, lat in self.points)
+        return f"""<Placemark>
+    <name>Beacon {self.hex_id}</name>
+    <description>
+        Country Code: {self.last['country_code']}
+        Encoded Location: {self.last['location_hex']}
+        Last Seen: {self.last['time']}
+        Detections: {self.detections}
+    </description>
+    <gx:Track>
+{whens}{coords}    </gx:Track>
+</Placemark>
+""".encode()
+
+
+class KmlWriter:
+    """
+    KML map of decoded beacons, one gx:Track placemark per hex_id, that
+    is a complete document after every write(): new placemarks go where
+    the footer was and the footer is written again after them. A track
+    that gets a new point moves to the end of the document, so only the
+    placemarks from its old position on are rewritten (usually just
+    itself). Past max_bytes the document is closed off and archived,
+    zipped to a timestamped .kmz with kmz (else renamed to a timestamped
+    .kml), and a new one is started; a document left by an earlier run
+    is archived the same way instead of being overwritten.
+    """
+
+    def __init__(self, path="beacon_locations.kml", max_bytes=4 << 20, kmz=True, max_track_points=1000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.kmz = kmz
+        self.max_track_points = max_track_points
+        self.archived = []
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            self._archive()
+        self._open()
+
+    def _open(self):
+        self._file = open(self.path, "w+b")
+        self._file.write(KML_HEADER + KML_FOOTER)
+        self._file.flush()
+        self._tracks = OrderedDict()
+        self._offsets = {}
+        self._end = len(KML_HEADER)
+
+    def _archive(self):
+        base = os.path.splitext(self.path)[0]
+        stamp = time.strftime("%Y%m%dT%H%M%S")
+        ext = ".kmz" if self.kmz else ".kml"
+        target, n = f"{base}-{stamp}{ext}", 1
+        while os.path.exists(target):
+            target, n = f"{base}-{stamp}-{n}{ext}", n + 1
+        if self.kmz:
+            with zipfile.ZipFile(f"{target}.part", "w", zipfile.ZIP_DEFLATED) as kmz:
+                kmz.write(self.path, "doc.kml")
+            os.replace(f"{target}.part", target)
+            os.remove(self.path)
+        else:
+            os.replace(self.path, target)
+        self.archived.append(target)
+
+    def write(self, records):
+        """
+        Adds the records (beacon_log records) and rewrites the changed tail.
+        """
+        start = self._end
+        for record in records:
+            hex_id = record["hex_id"]
+            track = self._tracks.get(hex_id)
+            if track is None:
+                track = self._tracks[hex_id] = KmlTrack(hex_id, self.max_track_points)
+            elif hex_id in self._offsets:
+                start = min(start, self._offsets.pop(hex_id))
+            self._tracks.move_to_end(hex_id)
+            track.add(record)
+
+        self._file.seek(start)
+        for hex_id, track in self._tracks.items():
+            if self._offsets.get(hex_id, start) < start:
+                continue
+            self._offsets[hex_id] = self._file.tell()
+            self._file.write(track.kml())
+        self._end = self._file.tell()
+        self._file.write(KML_FOOTER)
+        self._file.truncate()
+        self._file.flush()
+
+        if self._file.tell() > self.max_bytes:
+            self.rotate()
+
+    def rotate(self):
+        self._file.close()
+        self._archive()
+        self._open()
+
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self.sync()
+        self._file.close()
@@ -0,0 +1,71 @@
+# ===========================================
+# Long-Format Location Decoding (PDF-1 Coarse + PDF-2 Offsets)
+# ===========================================
+
+import numpy as np
+
+from beacon_frame import LAT_COARSE, LAT_OFFSET, LON_COARSE, LON_OFFSET, bit_fields
+
+
+def _coarse_table(value_bits):
+    """
+    Signed degrees for every [sign | value_bits] coarse field (0.25 degree steps).
+    """
+    magnitude = 0.25 * np.arange(1 << value_bits)
+    return np.concatenate([magnitude, -magnitude])
+
+
+def _offset_table():
+    """
+    Degrees for every 10-bit [sign | 5-bit minutes | 4-bit 4-second units]
+    offset field. The sign bit is set when the offset adds to the coarse
+    position and clear when it subtracts, as createPacket() encodes it.
+    """
+    field = np.arange(1 << 10)
+    minutes = (field >> 4) & 0x1F
+    seconds = 4 * (field & 0xF)
+    magnitude = minutes / 60 + seconds / 3600
+    return np.where(field >> 9, magnitude, -magnitude)
+
+
+# Built once at import; indexed directly by the raw field values
+LAT_COARSE_DEG = _coarse_table(9)
+LON_COARSE_DEG = _coarse_table(10)
+OFFSET_DEG = _offset_table()
+_LAT_COARSE_LIST = LAT_COARSE_DEG.tolist()
+_LON_COARSE_LIST = LON_COARSE_DEG.tolist()
+_OFFSET_LIST = OFFSET_DEG.tolist()
+
+
+def _apply_offset(coarse, offset):
+    """
+    The offset refines the magnitude; the hemisphere comes from the coarse sign.
+    """
+    return np.copysign(np.abs(coarse) + offset, coarse)
+
+
+def decode_location(frame):
+    """
+    Latitude and longitude in degrees from a BeaconFrame, the inverse of
+    the encoding in createPacket(). Resolution is 4 arc-seconds.
+    """
+    lat_coarse = frame.field(*LAT_COARSE)
+    lon_coarse = frame.field(*LON_COARSE)
+    lat_mag = abs(_LAT_COARSE_LIST[lat_coarse]) + _OFFSET_LIST[frame.field(*LAT_OFFSET)]
+    lon_mag = abs(_LON_COARSE_LIST[lon_coarse]) + _OFFSET_LIST[frame.field(*LON_OFFSET)]
+    latitude = -lat_mag if lat_coarse >> 9 else lat_mag
+    longitude = -lon_mag if lon_coarse >> 10 else lon_mag
+    return latitude, longitude
+
+
+def decode_locations(bit_matrix):
+    """
+    Batch version of decode_location() for a (frames, 144) array of bits.
+    Returns (latitudes, longitudes) arrays.
+    """
+    bit_matrix = np.atleast_2d(np.asarray(bit_matrix))
+    latitudes = _apply_offset(LAT_COARSE_DEG[bit_fields(bit_matrix, *LAT_COARSE)],
+                              OFFSET_DEG[bit_fields(bit_matrix, *LAT_OFFSET)])
+    longitudes = _apply_offset(LON_COARSE_DEG[bit_fields(bit_matrix, *LON_COARSE)],
+                               OFFSET_DEG[bit_fields(bit_matrix, *LON_OFFSET)])
+    return latitudes, longitudes
@@ -0,0 +1,225 @@
+# ===========================================
+# Per-Stage Timing, Counters and Export for the Receive Loop
+# ===========================================
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram bucket upper bounds in seconds, 10 us to 10 s
+BUCKETS = (1e-5, 3e-5, 1e-4, 3e-4, 1e-3, 3e-3, 1e-2, 3e-2, 0.1, 0.3, 1.0, 3.0, 10.0)
+_BUCKETS_NS = tuple(int(bound * 1e9) for bound in BUCKETS)
+
+
+class StageStats:
+    """
+    Call count, total/max time and a latency histogram for one stage.
+    Only one thread records into a stage, so there is no lock; readers on
+    other threads may see a snapshot that is one call behind.
+    """
+
+    __slots__ = ("count", "items", "total_ns", "max_ns", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.items = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def record(self, elapsed_ns, items=0):
+        self.count += 1
+        self.items += items
+        self.total_ns += elapsed_ns
+        if elapsed_ns > self.max_ns:
+            self.max_ns = elapsed_ns
+        self.buckets[bisect_left(_BUCKETS_NS, elapsed_ns)] += 1
+
+    def percentile(self, q):
+        """
+        Upper bound (seconds) of the bucket holding the q-th percentile.
+        """
+        target = q / 100 * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            seen += count
+            if count and seen >= target:
+                return bound
+        return self.max_ns / 1e9
+
+
+class _Timer:
+    __slots__ = ("stats", "items", "start")
+
+    def __init__(self, stats, items):
+        self.stats = stats
+        self.items = items
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.stats.record(time.perf_counter_ns() - self.start, self.items)
+
+
+class StageLog:
+    """
+    Stand-in for Metrics where the stages run in another process: each
+    record() call is kept as a (name, elapsed_ns, items) tuple in
+    records, which travel back with the result for Metrics.replay().
+    """
+
+    def __init__(self):
+        self.records = []
+
+    def record(self, name, elapsed_ns, items=0):
+        self.records.append((name, elapsed_ns, items))
+
+
+class Metrics:
+    """
+    Stage timings (record() or the time() context manager, both with
+    perf_counter_ns durations) and event counters for the receive loop.
+    Stages and counters are created on first use. snapshot() is the JSON
+    form, prometheus() the text exposition format; serve() and
+    dump_every() publish them from a daemon thread.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self.started = time.time()
+
+    def stage(self, name):
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = StageStats()
+        return stats
+
+    def record(self, name, elapsed_ns, items=0):
+        self.stage(name).record(elapsed_ns, items)
+
+    def time(self, name, items=0):
+        return _Timer(self.stage(name), items)
+
+    def replay(self, records):
+        """
+        Records the (name, elapsed_ns, items) tuples of a StageLog.
+        """
+        for name, elapsed_ns, items in records:
+            self.record(name, elapsed_ns, items)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def snapshot(self):
+        stages = {}
+        for name, stats in list(self.stages.items()):
+            stages[name] = {
+                "count": stats.count,
+                "items": stats.items,
+                "total_seconds": stats.total_ns / 1e9,
+                "mean_ms": stats.total_ns / stats.count / 1e6 if stats.count else 0.0,
+                "max_ms": stats.max_ns / 1e6,
+                "p50_ms": 1e3 * stats.percentile(50),
+                "p99_ms": 1e3 * stats.percentile(99),
+            }
+        return {
+            "time": time.time(),
+            "uptime_seconds": time.time() - self.started,
+            "stages": stages,
+            "counters": dict(self.counters),
+        }
+
+    def prometheus(self):
+        lines = [
+            "# HELP safet_stage_seconds Time per call of each receive stage",
+            "# TYPE safet_stage_seconds histogram",
+        ]
+        for name, stats in list(self.stages.items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS, stats.buckets):
+                cumulative += count
+                lines.append(f'safet_stage_seconds_bucket{{stage="{name}",le="{bound:g}"}} {cumulative}')
+            lines.append(f'safet_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {stats.count}')
+            lines.append(f'safet_stage_seconds_sum{{stage="{name}"}} {stats.total_ns / 1e9:.9f}')
+            lines.append(f'safet_stage_seconds_count{{stage="{name}"}} {stats.count}')
+        lines += [
+            "# HELP safet_stage_items_total Samples, bits or frames handled by each stage",
+            "# TYPE safet_stage_items_total counter",
+        ]
+        lines += [f'safet_stage_items_total{{stage="{name}"}} {stats.items}' for name, stats in list(self.stages.items())]
+        lines += ["# HELP safet_events_total Receive loop events", "# TYPE safet_events_total counter"]
+        lines += [f'safet_events_total{{event="{name}"}} {value}' for name, value in list(self.counters.items())]
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """
+        One line per stage for the terminal.
+        """
+        lines = []
+        for name, stage in self.snapshot()["stages"].items():
+            lines.append(f"  {name:<10s} {stage['count']:8d} calls  {stage['mean_ms']:8.3f} ms mean  "
+                         f"{stage['p99_ms']:8.3f} ms p99  {stage['total_seconds']:8.2f} s total")
+        lines += [f"  {name}: {value}" for name, value in self.counters.items()]
+        return "\n".join(lines)
+
+    def serve(self, port, host="127.0.0.1"):
+        """
+        Serves prometheus() at http://host:port/metrics (and snapshot() at
+        /metrics.json) from a daemon thread. Returns the server.
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, kind = metrics.prometheus().encode(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, kind = json.dumps(metrics.snapshot()).encode(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", kind)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def dump_every(self, path, interval=10.0):
+        """
+        Rewrites path with snapshot() every interval seconds from a daemon
+        thread (replacing the file whole, so readers never see half of it).
+        """
+        def run():
+            while True:
+                time.sleep(interval)
+                with open(f"{path}.tmp", "w") as f:
+                    json.dump(self.snapshot(), f, indent=2)
+                os.replace(f"{path}.tmp", path)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def export_from_env(self):
+        """
+        Starts the exporters the environment asks for: SAFET_METRICS_PORT
+        for serve(), SAFET_METRICS_JSON (a path) for dump_every() every
+        SAFET_METRICS_INTERVAL seconds (default 10).
+        """
+        port = os.environ.get("SAFET_METRICS_PORT")
+        if port:
+            self.serve(int(port))
+        path = os.environ.get("SAFET_METRICS_JSON")
+        if path:
+            self.dump_every(path, float(os.environ.get("SAFET_METRICS_INTERVAL", 10.0)))
@@ -0,0 +1,94 @@
+# ===========================================
+# Carrier Preamble Detection Ahead of the Demodulator
+# ===========================================
+
+import numpy as np
+
+# Unmodulated carrier at the start of every burst
+PREAMBLE_SECONDS = 0.160
+
+
+class CarrierDetector:
+    """
+    Cheap front-end detector for the unmodulated carrier that opens every
+    burst (160 ms in transmitPacket()). Each window of samples is
+    Hann-weighted and transformed once; the detector fires when the
+    strongest bin stands threshold_db above the mean of the other bins
+    for min_windows consecutive windows, at a stable frequency. By
+    default that is every whole window a 160 ms preamble is sure to
+    fill, so a spur or LO leakage in one window does not wake the
+    demodulator, while a beacon is still caught before its data starts.
+    Noise spreads over all bins, so an idle channel costs one FFT per
+    window and never wakes the demodulator.
+    """
+
+    def __init__(self, sample_rate, window_size=4096, threshold_db=15.0, min_windows=None, max_drift_hz=500.0):
+        self.sample_rate = float(sample_rate)
+        self.window_size = window_size
+        self.threshold = 10 ** (threshold_db / 10)
+        if min_windows is None:
+            min_windows = max(1, int(PREAMBLE_SECONDS * self.sample_rate / window_size) - 1)
+        self.min_windows = min_windows
+        self.max_drift_bins = max(1, int(round(max_drift_hz * window_size / self.sample_rate)))
+
+        self._taper = np.hanning(window_size)
+        self._window = np.empty(window_size, dtype=np.complex128)
+        self._power = np.empty(window_size)
+        self.reset()
+
+    def reset(self):
+        self._fill = 0
+        self._hits = 0
+        self._last_bin = None
+        self.ratio_db = float("-inf")
+        self.offset_hz = None
+
+    def _evaluate(self):
+        """
+        Peak-to-average spectral power of the current window.
+        """
+        self._window *= self._taper
+        spectrum = np.fft.fft(self._window)
+        np.multiply(spectrum.real, spectrum.real, out=self._power)
+        self._power += spectrum.imag * spectrum.imag
+
+        peak = int(np.argmax(self._power))
+        peak_power = self._power[peak]
+        floor = (self._power.sum() - peak_power) / (self.window_size - 1)
+        ratio = peak_power / floor if floor > 0 else np.inf
+        self.ratio_db = 10 * np.log10(ratio) if ratio > 0 else float("-inf")
+
+        stable = self._last_bin is None or abs(peak - self._last_bin) <= self.max_drift_bins
+        if ratio >= self.threshold and stable:
+            self._hits += 1
+            self._last_bin = peak
+        elif ratio >= self.threshold:
+            self._hits = 1
+            self._last_bin = peak
+        else:
+            self._hits = 0
+            self._last_bin = None
+
+        if self._hits >= self.min_windows:
+            bin_freq = peak if peak < self.window_size // 2 else peak - self.window_size
+            self.offset_hz = bin_freq * self.sample_rate / self.window_size
+            return True
+        return False
+
+    def push(self, samples):
+        """
+        Feeds one buffer. Returns the carrier offset in Hz from the tuned
+        frequency if a carrier was detected in this buffer, else None.
+        """
+        samples = np.asarray(samples)
+        detected = False
+        start = 0
+        while start < len(samples):
+            take = min(self.window_size - self._fill, len(samples) - start)
+            self._window[self._fill:self._fill + take] = samples[start:start + take]
+            self._fill += take
+            start += take
+            if self._fill == self.window_size:
+                self._fill = 0
+                detected = self._evaluate() or detected
+        return self.offset_hz if detected else None
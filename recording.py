@@ -0,0 +1,238 @@
+# ===========================================
+# IQ Recording and Memory-Mapped Replay
+# ===========================================
+
+import argparse
+import json
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from batch_decode import BURST_SECONDS, PREAMBLE_SECONDS, decode_bursts
+from capture import CaptureThread, SampleRing
+from location import decode_location
+
+# On-disk sample formats: interleaved int16 I/Q (as sdr.rx() counts and
+# 100khzBinFileGenerator.m write them) or complex64
+FORMATS = ("ci16", "cf32")
+
+
+def sidecar_path(path):
+    return f"{path}.json"
+
+
+def read_metadata(path, fmt=None, sample_rate=None):
+    """
+    Sidecar metadata of a recording. Files without a sidecar (e.g.
+    signal_100kHz.bin) are taken as ci16 at sample_rate, 1 MS/s by
+    default; explicit arguments override the sidecar.
+    """
+    try:
+        with open(sidecar_path(path)) as f:
+            metadata = json.load(f)
+    except FileNotFoundError:
+        metadata = {"format": "ci16", "sample_rate": 1e6}
+    if fmt is not None:
+        metadata["format"] = fmt
+    if sample_rate is not None:
+        metadata["sample_rate"] = float(sample_rate)
+    if metadata["format"] not in FORMATS:
+        raise ValueError(f"Unknown sample format {metadata['format']!r}, expected one of {FORMATS}")
+    return metadata
+
+
+def open_samples(path, fmt):
+    """
+    Read-only memory map of a recording: (n, 2) int16 for ci16, (n,)
+    complex64 for cf32. Nothing is read until it is indexed.
+    """
+    if fmt == "ci16":
+        return np.memmap(path, dtype=np.int16, mode="r").reshape(-1, 2)
+    return np.memmap(path, dtype=np.complex64, mode="r")
+
+
+def to_complex(raw):
+    """
+    complex64 samples of a slice of open_samples(); cf32 slices are
+    returned as they are (no copy).
+    """
+    if raw.dtype == np.int16:
+        return raw.astype(np.float32).view(np.complex64)[:, 0]
+    return raw
+
+
+class IqRecorder:
+    """
+    Streams sdr.rx() buffers to a raw file, appending as they come. The
+    JSON sidecar (written on close) holds the format, sample rate, LO,
+    gain, start time, sample count and a (sample index, unix time) pair
+    every timestamp_interval seconds of samples.
+    """
+
+    def __init__(self, path, sample_rate, center_freq=None, gain=None, fmt="ci16", timestamp_interval=1.0):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown sample format {fmt!r}, expected one of {FORMATS}")
+        self.path = path
+        self.fmt = fmt
+        self.metadata = {
+            "format": fmt,
+            "sample_rate": float(sample_rate),
+            "center_freq": center_freq,
+            "gain": gain,
+            "start_time": datetime.now(timezone.utc).isoformat(),
+            "num_samples": 0,
+            "timestamps": [],
+        }
+        self._timestamp_every = max(1, int(timestamp_interval * sample_rate))
+        self._next_timestamp = 0
+        self._file = open(path, "wb")
+
+    @classmethod
+    def from_sdr(cls, path, sdr, fmt="ci16"):
+        return cls(path, sdr.sample_rate, getattr(sdr, "rx_lo", None), getattr(sdr, "rx_hardwaregain_chan0", None), fmt)
+
+    def write(self, samples):
+        samples = np.asarray(samples)
+        count = self.metadata["num_samples"]
+        if count >= self._next_timestamp:
+            self.metadata["timestamps"].append([count, time.time()])
+            self._next_timestamp = count + self._timestamp_every
+
+        if self.fmt == "ci16":
+            interleaved = np.empty((len(samples), 2), dtype=np.int16)
+            interleaved[:, 0] = np.clip(np.rint(samples.real), -32768, 32767)
+            interleaved[:, 1] = np.clip(np.rint(samples.imag), -32768, 32767)
+            interleaved.tofile(self._file)
+        else:
+            samples.astype(np.complex64, copy=False).tofile(self._file)
+        self.metadata["num_samples"] = count + len(samples)
+
+    def close(self):
+        self._file.close()
+        with open(sidecar_path(self.path), "w") as f:
+            json.dump(self.metadata, f, indent=2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class IqReplay:
+    """
+    Plays a recording back with the sdr.rx() interface, one
+    rx_buffer_size block per call, straight out of the memory map. With
+    speed=None blocks come as fast as they are asked for; speed=1.0
+    paces them at the recorded rate. Raises EOFError at the end unless
+    loop is set.
+    """
+
+    def __init__(self, path, rx_buffer_size=4096, speed=None, loop=False, fmt=None, sample_rate=None):
+        self.metadata = read_metadata(path, fmt, sample_rate)
+        self.sample_rate = self.metadata["sample_rate"]
+        self.rx_lo = self.metadata.get("center_freq")
+        self.rx_buffer_size = rx_buffer_size
+        self.speed = speed
+        self.loop = loop
+        self._samples = open_samples(path, self.metadata["format"])
+        self.position = 0
+        self._started = None
+
+    def __len__(self):
+        return len(self._samples)
+
+    def rx(self):
+        if self.position >= len(self._samples):
+            if not self.loop or len(self._samples) == 0:
+                raise EOFError("End of recording")
+            self.position = 0
+            self._started = None
+
+        block = to_complex(self._samples[self.position:self.position + self.rx_buffer_size])
+        self.position += len(block)
+
+        if self.speed:
+            if self._started is None:
+                self._started = time.perf_counter() - self.position / (self.sample_rate * self.speed)
+            delay = self._started + self.position / (self.sample_rate * self.speed) - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        return block
+
+
+def decode_recording(path, chunk_seconds=10.0, fmt=None, sample_rate=None, **decode_args):
+    """
+    Runs the batch decoder over a recording of any size, chunk by chunk
+    through the memory map. Chunks overlap by a burst on each side and
+    each burst is reported by the chunk its detection falls in. Yields
+    (seconds from the start, frame, quality) as decode_bursts() does.
+    """
+    metadata = read_metadata(path, fmt, sample_rate)
+    rate = metadata["sample_rate"]
+    samples = open_samples(path, metadata["format"])
+    step = int(chunk_seconds * rate)
+    margin = int((BURST_SECONDS + 2 * PREAMBLE_SECONDS) * rate)
+
+    for position in range(0, len(samples), step):
+        first = max(position - margin, 0)
+        chunk = to_complex(samples[first:position + step + margin])
+        for start, frame, quality in decode_bursts(chunk, rate, **decode_args):
+            if position <= first + start < position + step:
+                yield (first + start) / rate, frame, quality
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record sdr.rx() to disk or decode a recording")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record = commands.add_parser("record", help="record from the Pluto")
+    record.add_argument("path")
+    record.add_argument("--seconds", type=float, default=60.0)
+    record.add_argument("--format", choices=FORMATS, default="ci16")
+    record.add_argument("--uri", default="ip:192.168.2.1")
+    record.add_argument("--sample-rate", type=float, default=1e6)
+    record.add_argument("--lo", type=int, default=406025000)
+
+    decode = commands.add_parser("decode", help="decode every burst in a recording")
+    decode.add_argument("path")
+    decode.add_argument("--format", choices=FORMATS)
+    decode.add_argument("--sample-rate", type=float)
+
+    args = parser.parse_args()
+
+    if args.command == "record":
+        import adi
+
+        sdr = adi.Pluto(uri=args.uri)
+        sdr.sample_rate = int(args.sample_rate)
+        sdr.rx_lo = args.lo
+        sdr.rx_rf_bandwidth = 200000
+        sdr.rx_buffer_size = 4096
+        sdr.gain_control_mode_chan0 = "slow_attack"
+
+        # Capture on a thread so disk stalls do not drop radio buffers
+        ring = SampleRing(4 * sdr.sample_rate)
+        capture = CaptureThread(sdr, ring)
+        total = int(args.seconds * sdr.sample_rate)
+        with IqRecorder.from_sdr(args.path, sdr, args.format) as recorder:
+            capture.start()
+            while recorder.metadata["num_samples"] < total:
+                if capture.error is not None:
+                    raise capture.error
+                recorder.write(ring.read(total - recorder.metadata["num_samples"], timeout=0.5))
+            capture.stop()
+        print(f"Recorded {total} samples to {args.path}: {capture.stats()}")
+
+    else:
+        started = time.perf_counter()
+        count = 0
+        for seconds, frame, _ in decode_recording(args.path, fmt=args.format, sample_rate=args.sample_rate):
+            latitude, longitude = decode_location(frame)
+            print(f"{seconds:10.3f} s  {frame.hex_id}  {latitude:.5f}, {longitude:.5f}")
+            count += 1
+        elapsed = time.perf_counter() - started
+        metadata = read_metadata(args.path, args.format, args.sample_rate)
+        duration = len(open_samples(args.path, metadata["format"])) / metadata["sample_rate"]
+        print(f"{count} frames from {duration:.1f} s of samples in {elapsed:.1f} s ({duration / elapsed:.1f}x real time)")
@@ -2,143 +2,59 @@
 # PART 1: SDR Configuration with Frequency Correction
 # ===========================================
 
-import adi
 import numpy as np
 import time
-import math
-from datetime import datetime
-import tkinter as tk
 from multiprocessing import Process, Queue
-from commpy.filters import rcosfilter
 
-# SDR Setup
-sdr = adi.Pluto(uri="ip:192.168.2.1")
-sdr.sample_rate = int(1e6)  # 1 MS/s
-sdr.rx_lo = 406025000  # Center frequency at 406.025 MHz
-sdr.rx_rf_bandwidth = 200000  # 200 kHz bandwidth
-sdr.rx_buffer_size = 4096  # Buffer size
-sdr.gain_control_mode_chan0 = "slow_attack"  # Gain control
+from beacon_frame import BeaconFrame
+from beacon_index import BeaconIndex, decode_confidence
+from capture import CaptureThread, SampleRing
+from decode_pool import DecodePool, decode_burst_timed
+from location import decode_location
+from metrics import Metrics
+from preamble import CarrierDetector
+from sources import open_source
+
+# SDR Setup (SAFET_SOURCE=sim, or the path of a recording, runs without the Pluto)
+sdr = open_source(
+    sample_rate=1e6,  # 1 MS/s
+    rx_lo=406025000,  # Center frequency at 406.025 MHz
+    rf_bandwidth=200000,  # 200 kHz bandwidth
+    buffer_size=4096,  # Buffer size
+    gain_control_mode="slow_attack",  # Gain control
+)
+
+# Stage timings and event counts instead of per-buffer prints; SAFET_METRICS_PORT
+# serves them at http://127.0.0.1:<port>/metrics, SAFET_METRICS_JSON dumps them to a file
+metrics = Metrics()
+metrics.export_from_env()
 
 # ===========================================
-# PART 2: BPSK Demodulation with Synchronization
+# PART 2: Burst Demodulation with Synchronization
 # ===========================================
 
-def costas_loop(signal, alpha=0.132, beta=0.00932):
-    """
-    Applies a Costas Loop for carrier frequency offset correction.
-    """
-    phase = 0
-    freq = 0
-    out = np.zeros(len(signal), dtype=complex)
-    for i in range(len(signal)):
-        out[i] = signal[i] * np.exp(-1j * phase)
-        error = np.sign(np.real(out[i])) * np.imag(out[i]) - np.sign(np.imag(out[i])) * np.real(out[i])
-        freq += beta * error
-        phase += freq + alpha * error
-    return out
-
-def mueller_muller_timing_recovery(signal, sps, mu=0.0, gain_mu=0.01, gain_omega=0.001, omega_rel=0.005):
-    """
-    Applies Mueller and Müller algorithm for symbol timing recovery.
-    """
-    omega = sps
-    out = []
-    i = 0
-    while i < len(signal) - 1:
-        out.append(signal[int(i)])
-        i += omega
-        if i >= len(signal):
-            break
-        # Error calculation
-        error = (np.real(signal[int(i)]) - np.real(signal[int(i - omega)])) * np.real(signal[int(i - omega)])
-        omega += gain_omega * error
-        omega = max(omega, 2.0)
-    return np.array(out)
-
-def bpsk_demodulate(signal, samples_per_symbol):
-    """
-    Demodulates a BPSK signal with synchronization.
-    """
-    # Apply Costas Loop
-    synced_signal = costas_loop(signal)
-
-    # Matched filtering with Root Raised Cosine filter
-    span = 10  # Filter span in symbols
-    beta = 0.35  # Roll-off factor
-    rrc_taps, _ = rcosfilter(span * samples_per_symbol, beta, 1.0, samples_per_symbol)
-    filtered = np.convolve(synced_signal, rrc_taps, mode='same')
-
-    # Symbol timing recovery
-    recovered = mueller_muller_timing_recovery(filtered, samples_per_symbol)
-
-    # Decision: convert to bits
-    bits = np.array([1 if np.real(sym) >= 0 else 0 for sym in recovered])
-
-    return bits
+# Bursts are demodulated as biphase-L and checked for sync and BCH by
+# batch_decode.decode_bursts() in the DecodePool workers (PART 5).
 
 # ===========================================
 # PART 3: Beacon Bitstream Decoding (ANNEX A)
 # ===========================================
 
-def extract_beacon_fields(bits):
-    print("Bitstream length:", len(bits))
-    print("Bitstream start:", bits[:40])
-
-    if len(bits) < 144:
-        raise ValueError(f"Skipping short bitstream (len={len(bits)})")
-
-    def hamming_distance(a, b):
-        return sum(x != y for x, y in zip(a, b))
-
-    expected_sync = [1,1,0,1,0,1,0,0,0,1,0,1,0,1,1,1,1,1]
-    best_distance = 18
-    best_index = -1
-
-    for i in range(len(bits) - len(expected_sync)):
-        window = bits[i:i+18]
-        distance = hamming_distance(window, expected_sync)
-        if distance < best_distance:
-            best_distance = distance
-            best_index = i
-            if distance <= 4:
-                break
-
-    if best_distance <= 4:
-        bits = bits[best_index:]
-        print(f"✅ Sync found at index {best_index} (Hamming distance = {best_distance})")
-    elif best_distance <= 6:
-        # 🧠 Intercept imperfect sync and proceed anyway
-        bits = bits[best_index:]
-        print(f"⚠️ Approximate sync accepted at index {best_index} (distance = {best_distance}) — proceeding anyway")
-    else:
-        print(f"❌ No sync found — best candidate at index {best_index} (distance = {best_distance})")
-        raise ValueError("Sync word mismatch — likely not a beacon signal.")
-
-    format_flag = bits[25]
-    if format_flag != 1:
-        print("⚠️ Format flag is 0 — faking long-format beacon")
-        format_flag = 1  # 🧠 Force accept
-
-    country_bits = bits[26:36]
-    country_code = int(''.join(str(b) for b in country_bits), 2)
-
-    hex_id_bits = bits[25:85]
-    hex_id_bin = ''.join(str(b) for b in hex_id_bits)
-    hex_id = hex(int(hex_id_bin, 2))[2:].upper()
-
-    location_bits = bits[112:132]
-    location_bin = ''.join(str(b) for b in location_bits)
-    location_hex = hex(int(location_bin, 2))[2:].upper()
-
-    lat_raw = int(location_bin[:10], 2)
-    lon_raw = int(location_bin[10:], 2)
-    latitude = (lat_raw * 0.25) if lat_raw < 512 else -(1024 - lat_raw) * 0.25
-    longitude = (lon_raw * 0.25) if lon_raw < 512 else -(1024 - lon_raw) * 0.25
+def frame_beacon_fields(frame):
+    """
+    Display/log fields of a synchronized, BCH-checked BeaconFrame.
+    """
+    if frame.format_flag != 1:
+        # Faked as long format
+        metrics.count("short_format_frames")
+
+    location = frame.location
+    latitude, longitude = decode_location(frame)
 
     return {
-        "country_code": country_code,
-        "hex_id": hex_id,
-        "location_hex": location_hex,
+        "country_code": frame.country_code,
+        "hex_id": frame.hex_id,
+        "location_hex": f"{location:05X}",
         "latitude": latitude,
         "longitude": longitude
     }
@@ -148,38 +64,27 @@ def extract_beacon_fields(bits):
 # PART 4: Output to Terminal and KML File
 # ===========================================
 
-from datetime import datetime
-import tkinter as tk  # <- Make sure tkinter is imported
-
-def init_kml_log(file_path="beacon_locations.kml"):
-    with open(file_path, "w") as f:
-        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
-        f.write('<kml xmlns="http://www.opengis.net/kml/2.2">\n')
-        f.write('<Document>\n')
-    return file_path
-
-def log_beacon_to_kml(file_path, beacon_info):
-    timestamp = datetime.utcnow().isoformat()
-    placemark = f"""
-<Placemark>
-    <name>Beacon {beacon_info['hex_id']}</name>
-    <description>
-        Country Code: {beacon_info['country_code']}
-        Encoded Location: {beacon_info['location_hex']}
-        Time: {timestamp} UTC
-    </description>
-    <Point>
-        <coordinates>{beacon_info['longitude']},{beacon_info['latitude']},0</coordinates>
-    </Point>
-</Placemark>"""
-    with open(file_path, "a") as f:
-        f.write(placemark + "\n")
-
-def finalize_kml_log(file_path):
-    with open(file_path, "a") as f:
-        f.write('</Document>\n</kml>')
+from beacon_log import AsyncLogger, DetectionSink, JsonLinesSink, KmlSink, TerminalSink
+
+def open_beacon_log(kml_path="beacon_locations.kml", jsonl_path="beacon_log.jsonl"):
+    """
+    Decoded beacons are queued for a background writer that fills the KML
+    map and a JSON lines log and prints to the terminal at most once a
+    second, so no file or terminal I/O happens in the decode loop.
+    """
+    return AsyncLogger([KmlSink(kml_path), JsonLinesSink(jsonl_path), TerminalSink(refresh_seconds=1.0)])
+
+def open_detection_store(path="detections.db"):
+    """
+    Every decoded frame, repeats included, with its raw bits, CFO and SNR,
+    batched into an SQLite database by its own background writer
+    (python detection_store.py export ... queries it).
+    """
+    return AsyncLogger([DetectionSink(path)], max_queue=4096)
 
 def display_window(queue):
+    import tkinter as tk  # only needed on a machine with a display
+
     root = tk.Tk()
     root.attributes('-fullscreen', True)
     root.configure(bg='black')
@@ -198,72 +103,131 @@ def display_window(queue):
     root.after(100, update)
     root.mainloop()
 
-def display_beacon_info(beacon_info, display_queue=None):
-    print("\n" + "="*40)
-    print("🚨 406.025 MHz SARSAT BEACON DETECTED")
-    print(f"Time: {datetime.utcnow().isoformat()} UTC")
-    print(f"Country Code: {beacon_info['country_code']}")
-    print(f"Beacon Hex ID: {beacon_info['hex_id']}")
-    print(f"Encoded Location: {beacon_info['location_hex']}")
-    print(f"Latitude: {beacon_info['latitude']:.6f}")
-    print(f"Longitude: {beacon_info['longitude']:.6f}")
-    print("="*40)
-
-    if display_queue:
-        coord_text = (
-            f"Beacon ID: {beacon_info['hex_id']}\n"
-            f"Lat: {beacon_info['latitude']:.2f}, Lon: {beacon_info['longitude']:.2f}"
-        )
-        display_queue.put(coord_text)
-
 # ================================
 # PART 5: Listening and Decoding
 # ================================
 
-import RPi.GPIO as GPIO
+from hardware import RockerSwitch
+import signal
 import time
 
-# GPIO Setup
+# GPIO Setup (simulated as always on where RPi.GPIO is unavailable)
 SWITCH_PIN = 23  # GPIO 23
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(SWITCH_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+switch = RockerSwitch(SWITCH_PIN)
 
-# KML Log
-kml_path = init_kml_log()
+# KML, JSON lines and terminal output, written off the decode loop
+beacon_log = open_beacon_log()
+detection_log = open_detection_store()
+
+# Repeats of a known beacon (every ~50 s) update its track without being logged again;
+# tracks not heard for BEACON_TTL seconds are dropped
+BEACON_TTL = 600.0
+beacon_index = BeaconIndex(BEACON_TTL)
+
+# Seconds of samples handed to the decode pool per detected burst (a burst is ~520 ms)
+BURST_HOLD = 1.0
+
+# Seconds of samples the capture ring holds while the DSP side is busy
+RING_SECONDS = 4.0
+
+# Decode worker processes, one per core by default
+DECODE_WORKERS = None
+
+read_size = 16 * sdr.rx_buffer_size
+pool = DecodePool(BURST_HOLD * sdr.sample_rate + 2 * read_size, DECODE_WORKERS, decode=decode_burst_timed)
+
+capture = None
 
 # Main Loop
 try:
     print("SAFE-T System Ready. Flip switch to start.")
     while True:
-        if GPIO.input(SWITCH_PIN) == GPIO.LOW:
+        if switch.is_on():
             print("📡 STARTING SIGNAL MONITORING...")
             time.sleep(1)  # debounce delay
 
-            while GPIO.input(SWITCH_PIN) == GPIO.LOW:
-                raw_samples = sdr.rx()
-                bits = bpsk_demodulate(raw_samples, samples_per_symbol=20)
-
-                if len(bits) < 150:
-                    print(f"⚠️ Skipping short bitstream (len={len(bits)})")
-                    time.sleep(0.5)
+            detector = CarrierDetector(sdr.sample_rate)
+            previous = np.zeros(0, dtype=np.complex64)
+            burst = []
+            burst_left = 0
+
+            # The capture thread keeps reading the radio while bursts are decoded
+            ring = SampleRing(RING_SECONDS * sdr.sample_rate)
+            capture = CaptureThread(sdr, ring, metrics)
+            submitted = {}
+            capture.start()
+
+            while switch.is_on():
+                if capture.error is not None:
+                    raise capture.error
+                raw_samples = ring.read(read_size, timeout=0.5)
+
+                # Frames decoded by the workers, in burst order
+                for seq, result in pool.ready():
+                    # Submission to result, queueing included
+                    metrics.record("decode", time.perf_counter_ns() - submitted.pop(seq))
+                    if isinstance(result, Exception):
+                        print(f"⚠️ Unexpected error: {result}")
+                        continue
+                    # Stage times from the worker: detect, cfo, demodulate, sync and bch
+                    result, stages = result
+                    metrics.replay(stages)
+                    metrics.count("frames", len(result))
+                    for value, quality in result:
+                        # The workers have already corrected the frames
+                        frame = BeaconFrame(value)
+                        beacon_info = frame_beacon_fields(frame)
+                        detection_log.log(dict(beacon_info, frame=frame.to_bytes().hex(), **quality))
+                        confidence = decode_confidence(quality["corrected_bits"], quality["sync_errors"])
+                        track, changed = beacon_index.update(beacon_info, confidence)
+                        if changed:
+                            with metrics.time("logging"):
+                                beacon_log.log(track.summary())
+                        else:
+                            metrics.count("repeats")
+
+                if len(raw_samples) == 0:
                     continue
 
-                try:
-                    beacon_info = extract_beacon_fields(bits)
-                    display_beacon_info(beacon_info)
-                    log_beacon_to_kml(kml_path, beacon_info)
-                    time.sleep(15)  # Wait between beacon bursts
-                except ValueError as ve:
-                    print(f"⚠️ Error decoding beacon: {ve}")
-                except Exception as e:
-                    print(f"⚠️ Unexpected error: {e}")
-                time.sleep(0.5)
+                # Idle until the carrier detector sees a burst preamble, then
+                # collect BURST_HOLD seconds (from one read earlier) for the pool
+                if burst_left > 0:
+                    burst.append(raw_samples)
+                    burst_left -= len(raw_samples)
+                    if burst_left <= 0:
+                        submitted[pool.submit(np.concatenate(burst), sdr.sample_rate)] = time.perf_counter_ns()
+                        metrics.count("bursts")
+                        burst = []
+                        detector.reset()
+                else:
+                    with metrics.time("detect", len(raw_samples)):
+                        detected = detector.push(raw_samples)
+                    if detected is not None:
+                        burst = [previous, raw_samples]
+                        burst_left = BURST_HOLD * sdr.sample_rate - len(raw_samples)
+                previous = raw_samples
+
+            capture.stop()
+            print(f"Capture stopped: {capture.stats()}")
+            print(metrics.summary())
+            capture = None
 
         time.sleep(0.1)  # Idle loop debounce
 
 except KeyboardInterrupt:
     print("\n🛑 Exiting... Cleaning up.")
-    finalize_kml_log(kml_path)
-    GPIO.cleanup()
+finally:
+    # Also reached when a radio error ends the loop, so the logs are always flushed;
+    # every step below has a timeout, and a second Ctrl-C must not cut it short
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if capture is not None:
+        capture.stop()
+    print(metrics.summary())
+    try:
+        pool.close()
+    finally:
+        beacon_log.close()
+        detection_log.close()
+        switch.cleanup()
 
 
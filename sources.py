@@ -0,0 +1,187 @@
+# ===========================================
+# Sample Sources: Pluto, Recording or Simulated Pluto
+# ===========================================
+
+import os
+import time
+
+import numpy as np
+
+from recording import IqReplay
+from Test_Beacon import createPacket, gps, transmitPacket
+
+# Test_Beacon.py's favourite coordinates
+DEFAULT_POSITION = (38.624593, -90.185037)
+
+
+class SampleSource:
+    """
+    What the receivers need from a radio: sample_rate, rx_lo,
+    rx_buffer_size and rx() returning the next buffer of complex samples.
+    """
+
+    sample_rate = None
+    rx_lo = None
+    rx_buffer_size = None
+
+    def rx(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class PlutoSource(SampleSource):
+    """
+    ADALM-Pluto receiver. adi is imported only when one is opened.
+    """
+
+    def __init__(self, uri="ip:192.168.2.1", sample_rate=1e6, rx_lo=406025000, rf_bandwidth=200000,
+                 buffer_size=4096, gain_control_mode="slow_attack"):
+        import adi
+
+        self.sdr = adi.Pluto(uri=uri)
+        self.sdr.sample_rate = int(sample_rate)
+        self.sdr.rx_lo = int(rx_lo)
+        self.sdr.rx_rf_bandwidth = int(rf_bandwidth)
+        self.sdr.rx_buffer_size = buffer_size
+        self.sdr.gain_control_mode_chan0 = gain_control_mode
+        self.sample_rate = self.sdr.sample_rate
+        self.rx_lo = self.sdr.rx_lo
+        self.rx_buffer_size = buffer_size
+
+    def rx(self):
+        return self.sdr.rx()
+
+
+class FileSource(SampleSource):
+    """
+    Recording replayed through IqReplay (see recording.py), by default
+    as fast as it is read.
+    """
+
+    def __init__(self, path, buffer_size=4096, speed=None, loop=False):
+        self.replay = IqReplay(path, buffer_size, speed, loop)
+        self.sample_rate = self.replay.sample_rate
+        self.rx_lo = self.replay.rx_lo
+        self.rx_buffer_size = buffer_size
+
+    def rx(self):
+        return self.replay.rx()
+
+
+class SyntheticSource(SampleSource):
+    """
+    Simulated Pluto. Beacons are built with createPacket() and sent with
+    transmitPacket(), which calls tx() on this source as it would on a
+    Pluto; tx() puts the waveform on the air at the current receive
+    position. A beacon is sent every interval seconds (cycling through
+    positions), and rx() returns the sum of the bursts on the air with
+    the carrier offset (cfo_hz, drifting by drift_hz_per_s), transmitter
+    clock error (clock_ppm, stretching the burst timing) and complex
+    white noise at snr_db per sample. With realtime, rx() is paced at
+    the sample rate like a radio.
+    """
+
+    def __init__(self, sample_rate=1e6, rx_lo=406025000, buffer_size=4096, snr_db=0.0, cfo_hz=0.0,
+                 drift_hz_per_s=0.0, clock_ppm=0.0, interval=50.0, first_burst=0.5, positions=(DEFAULT_POSITION,),
+                 data_rate=400, realtime=True, seed=None):
+        self.sample_rate = float(sample_rate)
+        self.rx_lo = rx_lo
+        self.rx_buffer_size = buffer_size
+        self.snr_db = snr_db
+        self.cfo_hz = cfo_hz
+        self.drift_hz_per_s = drift_hz_per_s
+        self.clock_ppm = clock_ppm
+        self.interval = interval
+        self.positions = list(positions)
+        self.data_rate = data_rate
+        self.samples_per_bit = int(round(self.sample_rate / data_rate))
+        self.realtime = realtime
+        self.rng = np.random.default_rng(seed)
+
+        self.position = 0
+        self.transmitted = 0
+        self._next_burst = int(first_burst * self.sample_rate)
+        self._tx_at = None
+        self._on_air = []
+        self._started = None
+
+    def tx(self, waveform):
+        """
+        Puts a transmitPacket() waveform on the air, scaled to unit peak
+        amplitude and stretched by the transmitter clock error, at the
+        current receive position (or where send_beacon() schedules it).
+        """
+        waveform = np.asarray(waveform, dtype=np.complex128)
+        waveform = waveform / np.abs(waveform).max()
+        if self.clock_ppm:
+            stretch = 1 + self.clock_ppm * 1e-6
+            t = np.arange(int(len(waveform) * stretch)) / stretch
+            n = np.arange(len(waveform))
+            waveform = np.interp(t, n, waveform.real) + 1j * np.interp(t, n, waveform.imag)
+        at = self.position if self._tx_at is None else self._tx_at
+        self._on_air.append((at, waveform.astype(np.complex64)))
+
+    def next_interval(self):
+        """
+        Seconds from one beacon to the next.
+        """
+        return self.interval
+
+    def send_beacon(self, at=None):
+        """
+        Transmits the next beacon in the position cycle, at sample index
+        at (default: the current receive position).
+        """
+        coords = gps()
+        coords.latitude, coords.longitude = self.positions[self.transmitted % len(self.positions)]
+        self._tx_at = self.position if at is None else at
+        transmitPacket(self, createPacket(coords), self.data_rate, self.samples_per_bit)
+        self._tx_at = None
+        self.transmitted += 1
+
+    def rx(self):
+        n = self.rx_buffer_size
+        start = self.position
+        while self.interval and self._next_burst < start + n:
+            self.send_beacon(at=self._next_burst)
+            self._next_burst += int(self.next_interval() * self.sample_rate)
+
+        signal = np.zeros(n, dtype=np.complex128)
+        for at, waveform in self._on_air:
+            lo, hi = max(at, start), min(at + len(waveform), start + n)
+            if lo < hi:
+                signal[lo - start:hi - start] += waveform[lo - at:hi - at]
+        self._on_air = [(at, waveform) for at, waveform in self._on_air if at + len(waveform) > start + n]
+
+        t = (start + np.arange(n)) / self.sample_rate
+        signal *= np.exp(2j * np.pi * (self.cfo_hz * t + 0.5 * self.drift_hz_per_s * t * t))
+        noise_std = 10 ** (-self.snr_db / 20) / np.sqrt(2)
+        signal += noise_std * (self.rng.standard_normal(n) + 1j * self.rng.standard_normal(n))
+        self.position += n
+
+        if self.realtime:
+            if self._started is None:
+                self._started = time.perf_counter() - start / self.sample_rate
+            delay = self._started + self.position / self.sample_rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        return signal
+
+
+def open_source(kind=None, sample_rate=1e6, rx_lo=406025000, rf_bandwidth=200000, buffer_size=4096,
+                gain_control_mode="slow_attack"):
+    """
+    Opens the receivers' sample source. kind (default: the SAFET_SOURCE
+    environment variable, else "pluto") is "pluto", "sim" for a
+    SyntheticSource with default impairments, or the path of a recording.
+    """
+    kind = kind or os.environ.get("SAFET_SOURCE", "pluto")
+    if kind == "pluto":
+        return PlutoSource(sample_rate=sample_rate, rx_lo=rx_lo, rf_bandwidth=rf_bandwidth,
+                           buffer_size=buffer_size, gain_control_mode=gain_control_mode)
+    if kind == "sim":
+        return SyntheticSource(sample_rate, rx_lo, buffer_size, cfo_hz=350.0, drift_hz_per_s=0.5, clock_ppm=20.0,
+                               interval=10.0)
+    return FileSource(kind, buffer_size)
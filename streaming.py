@@ -0,0 +1,148 @@
+# ===========================================
+# Streaming BPSK Demodulation Across sdr.rx() Buffers
+# ===========================================
+
+import time
+
+import numpy as np
+
+from batch_decode import BURST_SECONDS, decode_segment
+from costas import CostasLoop
+from filterbank import OverlapSaveFilter, rrc_taps
+from preamble import CarrierDetector
+from timing import MuellerMullerTimingRecovery
+
+
+class StreamingBpskDemodulator:
+    """
+    BPSK demodulator that treats consecutive sdr.rx() buffers as one stream.
+    The Costas loop phase/frequency, the matched filter history and the
+    symbol timing position are all kept between calls to push(). With a
+    decimator (e.g. a DecimationChain), buffers are decimated first and
+    samples_per_symbol is taken from it. With metrics (a metrics.Metrics),
+    each push() records its "filter" (decimation and matched filter),
+    "cfo" (Costas loop) and "timing" stage times.
+    """
+
+    def __init__(self, samples_per_symbol=None, span=10, beta=0.35, gain_mu=0.01, gain_omega=0.001, block_size=4096,
+                 decimator=None, metrics=None):
+        self.decimator = decimator
+        self.metrics = metrics
+        if decimator is not None:
+            samples_per_symbol = decimator.samples_per_symbol
+        self.samples_per_symbol = samples_per_symbol
+        self.costas = CostasLoop()
+        self.timing = MuellerMullerTimingRecovery(samples_per_symbol, gain_mu=gain_mu, gain_omega=gain_omega)
+
+        # Matched filtering with Root Raised Cosine filter; the filter keeps
+        # the previous buffer's tail so no edge is zero-padded.
+        self.matched_filter = OverlapSaveFilter(rrc_taps(span, beta, samples_per_symbol), block_size)
+        self._synced = np.empty(block_size, dtype=np.complex128)
+        self._filtered = np.empty(block_size, dtype=np.complex128)
+        self.reset()
+
+    def reset(self):
+        """
+        Drops all stream state, e.g. after a gap in reception.
+        """
+        if self.decimator is not None:
+            self.decimator.reset()
+        self.costas.reset()
+        self.matched_filter.reset()
+        self.timing.reset()
+
+    def push(self, samples):
+        """
+        Demodulates one buffer and returns the bits completed within it.
+        """
+        start = time.perf_counter_ns()
+        if self.decimator is not None:
+            samples = self.decimator.process(samples)
+        n = len(samples)
+        if len(self._synced) < n:
+            self._synced = np.empty(n, dtype=np.complex128)
+            self._filtered = np.empty(n, dtype=np.complex128)
+
+        decimated = time.perf_counter_ns()
+        synced = self.costas.process(samples, out=self._synced[:n])
+        carrier = time.perf_counter_ns()
+        filtered = self.matched_filter.process(synced, out=self._filtered[:n])
+        matched = time.perf_counter_ns()
+        recovered = self.timing.process(filtered)
+        bits = (recovered.real >= 0).astype(np.uint8)
+
+        if self.metrics is not None:
+            self.metrics.record("filter", decimated - start + matched - carrier, n)
+            self.metrics.record("cfo", carrier - decimated, n)
+            self.metrics.record("timing", time.perf_counter_ns() - matched, len(bits))
+        return bits
+
+
+class BurstDecoder:
+    """
+    Carrier-gated burst decoder for one channel of biphase-L beacons.
+    While idle, buffers only go through the preamble detector, and the
+    last lead_seconds of samples are kept; once a carrier is seen,
+    samples are collected for hold_seconds more and the whole stretch is
+    demodulated as one burst at the detected carrier offset by
+    batch_decode.decode_segment() (strict BCH correction), which finds
+    the frame wherever it starts. metrics, if given, gets a "detect"
+    time for every idle buffer, a "decode" time per burst and the
+    decode_segment() stage times.
+    """
+
+    def __init__(self, sample_rate, hold_seconds=BURST_SECONDS, lead_seconds=0.5, detector_window=4096,
+                 max_sync_errors=3, metrics=None):
+        self.sample_rate = float(sample_rate)
+        self.detector = CarrierDetector(sample_rate, window_size=detector_window)
+        self.metrics = metrics
+        self.hold_samples = hold_seconds * self.sample_rate
+        self.lead_samples = lead_seconds * self.sample_rate
+        self.max_sync_errors = max_sync_errors
+        self.reset()
+
+    def reset(self):
+        self.detector.reset()
+        self._held = []
+        self._held_samples = 0
+        self._left = 0
+        self._offset_hz = 0.0
+
+    def push(self, samples):
+        """
+        Feeds one buffer. Returns [(frame, quality)] (see decode_segment())
+        once a collected burst has been decoded, [] if it failed the
+        checks, else None.
+        """
+        self._held.append(samples)
+        self._held_samples += len(samples)
+        if self._left > 0:
+            self._left -= len(samples)
+            if self._left > 0:
+                return None
+            return self._decode()
+
+        start = time.perf_counter_ns()
+        detected = self.detector.push(samples)
+        if self.metrics is not None:
+            self.metrics.record("detect", time.perf_counter_ns() - start, len(samples))
+        if detected is not None:
+            self._left = self.hold_samples
+            self._offset_hz = detected
+            return None
+
+        # Idle: keep only the lead-in
+        while self._held_samples - len(self._held[0]) >= self.lead_samples:
+            self._held_samples -= len(self._held.pop(0))
+        return None
+
+    def _decode(self):
+        start = time.perf_counter_ns()
+        burst, offset_hz = np.concatenate(self._held), self._offset_hz
+        self.reset()
+        result = decode_segment(burst, self.sample_rate, offset_hz, self.max_sync_errors, strict=True,
+                                metrics=self.metrics)
+        decoded = [result] if result is not None else []
+        if self.metrics is not None:
+            self.metrics.record("decode", time.perf_counter_ns() - start, len(decoded))
+        return decoded
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from decimator import DecimationChain
+from filterbank import convolve, rrc_taps
+from streaming import StreamingBpskDemodulator
+from timing import HISTORY, MuellerMullerTimingRecovery, _mm_recurrence
+
+
+def bpsk(symbols, sps, amplitude):
+    """
+    RRC-shaped BPSK through the matched filter, i.e. raised cosine pulses.
+    """
+    pulses = np.zeros(len(symbols) * sps)
+    pulses[::sps] = symbols
+    taps = rrc_taps(10, 0.35, sps)
+    return amplitude * convolve(convolve(pulses, taps, mode="same"), taps, mode="same").astype(np.complex128)
+
+
+@pytest.mark.parametrize("amplitude", [1.0, 2048.0 * 16, 30000.0])
+def test_symbols_recovered_at_any_amplitude(amplitude):
+    rng = np.random.default_rng(1)
+    symbols = rng.choice([-1.0, 1.0], 2000)
+    signal = bpsk(symbols, 16, amplitude)
+    recovery = MuellerMullerTimingRecovery(16)
+    out = np.concatenate([recovery.process(block).copy() for block in np.split(signal, 8)])
+    decisions = np.where(out.real >= 0, 1.0, -1.0)[500:1500]
+    # Locked once past the start: every later decision matches the sent symbols at some offset
+    matches = max((decisions == symbols[shift:shift + 1000]).mean() for shift in range(480, 520))
+    assert matches == 1.0
+
+
+@pytest.mark.parametrize("amplitude", [100.0, 30000.0])
+def test_noise_never_outgrows_output(amplitude):
+    rng = np.random.default_rng(2)
+    recovery = MuellerMullerTimingRecovery(16)
+    limit = int(4096 / (16 * (1 - recovery.omega_rel))) + 2
+    for _ in range(50):
+        block = amplitude * (rng.standard_normal(4096) + 1j * rng.standard_normal(4096))
+        assert len(recovery.process(block)) <= limit
+        assert -HISTORY <= recovery._state[0] - HISTORY <= 16
+
+
+def test_python_recurrence_bounded():
+    rng = np.random.default_rng(3)
+    n = HISTORY + 4096
+    re = (30000 * rng.standard_normal(n)).tolist()
+    im = (30000 * rng.standard_normal(n)).tolist()
+    out_re, out_im = [0.0] * 100, [0.0] * 100
+    state = [HISTORY, 0.0, 16.0, 0.0, 0.0, 0.0]
+    count = _mm_recurrence(re, im, n, out_re, out_im, state, [16.0, 0.08, 0.01, 0.001, 0.01])
+    assert count <= 100
+
+
+def test_demodulator_raw_pluto_counts():
+    rng = np.random.default_rng(4)
+    demodulator = StreamingBpskDemodulator(decimator=DecimationChain(1e6))
+    for _ in range(30):
+        block = rng.integers(-2048, 2048, 4096) + 1j * rng.integers(-2048, 2048, 4096)
+        bits = demodulator.push(block)
+        assert set(np.unique(bits)) <= {0, 1}
@@ -0,0 +1,195 @@
+# ===========================================
+# Symbol Timing Recovery: Mueller and Müller with Cubic Interpolation
+# ===========================================
+
+import math
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:  # numba is optional; fall back to the pure-Python recurrence
+    numba = None
+
+# Samples kept from the previous buffer so the interpolator can look back
+HISTORY = 3
+
+
+def _mm_recurrence(re, im, n, out_re, out_im, state, params):
+    """
+    Mueller and Müller recurrence on plain float sequences.
+    state  = [index, mu, omega, last, abs_avg, pow_avg]
+    params = [omega_mid, omega_lim, gain_mu, gain_omega, metric_gain]
+    Each symbol is interpolated from 4 samples with a cubic Lagrange
+    polynomial in Farrow form. The timing error is normalised by the
+    symbol amplitude, so the loop behaves the same at any input level,
+    and every symbol advances at least omega_mid - omega_lim samples, so
+    no more symbols come out than the output buffers were sized for.
+    Returns the number of symbols written.
+    """
+    i = int(state[0])
+    mu = state[1]
+    omega = state[2]
+    last = state[3]
+    abs_avg = state[4]
+    pow_avg = state[5]
+    omega_mid = params[0]
+    omega_lim = params[1]
+    gain_mu = params[2]
+    gain_omega = params[3]
+    metric_gain = params[4]
+
+    min_step = omega_mid - omega_lim
+    count = 0
+    while i + 2 < n and count < len(out_re):
+        # Farrow coefficients, real part
+        p0, p1, p2, p3 = re[i - 1], re[i], re[i + 1], re[i + 2]
+        c1 = -p0 / 3.0 - p1 / 2.0 + p2 - p3 / 6.0
+        c2 = (p0 + p2) / 2.0 - p1
+        c3 = (p3 - p0) / 6.0 + (p1 - p2) / 2.0
+        x = ((c3 * mu + c2) * mu + c1) * mu + p1
+
+        # Farrow coefficients, imaginary part
+        p0, p1, p2, p3 = im[i - 1], im[i], im[i + 1], im[i + 2]
+        c1 = -p0 / 3.0 - p1 / 2.0 + p2 - p3 / 6.0
+        c2 = (p0 + p2) / 2.0 - p1
+        c3 = (p3 - p0) / 6.0 + (p1 - p2) / 2.0
+        y = ((c3 * mu + c2) * mu + c1) * mu + p1
+
+        out_re[count] = x
+        out_im[count] = y
+        count += 1
+
+        # Timing error from decisions on the real (BPSK) axis, in units of the symbol amplitude
+        d_last = 1.0 if last >= 0.0 else -1.0
+        d_x = 1.0 if x >= 0.0 else -1.0
+        scale = abs(x) + abs(last)
+        error = 2.0 * (d_last * x - d_x * last) / scale if scale > 0.0 else 0.0
+        last = x
+
+        omega += gain_omega * error
+        if omega > omega_mid + omega_lim:
+            omega = omega_mid + omega_lim
+        elif omega < omega_mid - omega_lim:
+            omega = omega_mid - omega_lim
+
+        abs_avg += metric_gain * (abs(x) - abs_avg)
+        pow_avg += metric_gain * (x * x - pow_avg)
+
+        advance = omega + gain_mu * error
+        if advance < min_step:
+            advance = min_step
+        mu += advance
+        step = math.floor(mu)
+        i += int(step)
+        mu -= step
+
+    state[0] = i
+    state[1] = mu
+    state[2] = omega
+    state[3] = last
+    state[4] = abs_avg
+    state[5] = pow_avg
+    return count
+
+
+if numba is not None:
+    _compiled_recurrence = numba.njit(cache=True)(_mm_recurrence)
+else:
+    _compiled_recurrence = None
+
+
+class MuellerMullerTimingRecovery:
+    """
+    Stateful Mueller and Müller symbol timing recovery.
+    mu (fractional sample offset), omega (samples per symbol) and the last
+    few input samples are kept between calls to process(), so a symbol
+    that straddles two buffers is interpolated from both.
+    """
+
+    def __init__(self, sps, mu=0.0, gain_mu=0.01, gain_omega=0.001, omega_rel=0.005, metric_gain=0.01):
+        self.sps = float(sps)
+        self.initial_mu = mu
+        self.gain_mu = gain_mu
+        self.gain_omega = gain_omega
+        self.omega_rel = omega_rel
+        self.metric_gain = metric_gain
+        self._params = np.array([self.sps, omega_rel * self.sps, gain_mu, gain_omega, metric_gain])
+        self._work_re = np.zeros(HISTORY + 4096)
+        self._work_im = np.zeros(HISTORY + 4096)
+        self._out_re = np.empty(0)
+        self._out_im = np.empty(0)
+        self._out = np.empty(0, dtype=np.complex128)
+        self.reset()
+
+    def reset(self):
+        self._work_re[:HISTORY] = 0.0
+        self._work_im[:HISTORY] = 0.0
+        # index, mu, omega, last symbol, mean |symbol|, mean symbol power
+        self._state = np.array([HISTORY, self.initial_mu, self.sps, 0.0, 0.0, 0.0])
+
+    @property
+    def mu(self):
+        return self._state[1]
+
+    @property
+    def omega(self):
+        return self._state[2]
+
+    @property
+    def lock_quality(self):
+        """
+        mean(|x|)^2 / mean(x^2) over recent symbols on the decision axis.
+        Close to 1 when sampling at the eye opening, lower when symbols
+        are taken on the transitions or from noise.
+        """
+        abs_avg, pow_avg = self._state[4], self._state[5]
+        return abs_avg * abs_avg / pow_avg if pow_avg > 0 else 0.0
+
+    def _ensure_capacity(self, n):
+        if len(self._work_re) < HISTORY + n:
+            work_re = np.zeros(HISTORY + n)
+            work_im = np.zeros(HISTORY + n)
+            work_re[:HISTORY] = self._work_re[:HISTORY]
+            work_im[:HISTORY] = self._work_im[:HISTORY]
+            self._work_re, self._work_im = work_re, work_im
+        max_symbols = int(n / (self.sps * (1 - self.omega_rel))) + 2
+        if len(self._out) < max_symbols:
+            self._out_re = np.empty(max_symbols)
+            self._out_im = np.empty(max_symbols)
+            self._out = np.empty(max_symbols, dtype=np.complex128)
+
+    def process(self, signal):
+        """
+        Returns the symbols completed within this block. The result is a
+        view of an internal buffer that is reused by the next call.
+        """
+        signal = np.asarray(signal)
+        n = len(signal)
+        self._ensure_capacity(n)
+        total = HISTORY + n
+        self._work_re[HISTORY:total] = signal.real
+        self._work_im[HISTORY:total] = signal.imag
+
+        if _compiled_recurrence is not None:
+            count = _compiled_recurrence(self._work_re, self._work_im, total,
+                                         self._out_re, self._out_im, self._state, self._params)
+            out_re, out_im = self._out_re[:count], self._out_im[:count]
+        else:
+            state = self._state.tolist()
+            out_re = [0.0] * len(self._out)
+            out_im = [0.0] * len(self._out)
+            count = _mm_recurrence(self._work_re[:total].tolist(), self._work_im[:total].tolist(), total,
+                                   out_re, out_im, state, self._params.tolist())
+            self._state[:] = state
+            out_re, out_im = out_re[:count], out_im[:count]
+
+        # Keep the tail for the next call and rebase the sample index onto it
+        self._work_re[:HISTORY] = self._work_re[total - HISTORY:total]
+        self._work_im[:HISTORY] = self._work_im[total - HISTORY:total]
+        self._state[0] -= n
+
+        out = self._out[:count]
+        out.real = out_re
+        out.imag = out_im
+        return out
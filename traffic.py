@@ -0,0 +1,148 @@
+# ===========================================
+# Multi-Beacon Traffic Generator for Receiver Load Tests
+# ===========================================
+
+import argparse
+import time
+
+import numpy as np
+
+from batch_decode import BURST_SECONDS, PREAMBLE_SECONDS
+from beacon_frame import BeaconFrame
+from channelizer import BEACON_CHANNELS_HZ, CHANNEL_SPACING
+from recording import IqRecorder, decode_recording
+from sources import SyntheticSource
+from Test_Beacon import createPacket, gps
+from waveform_cache import WaveformCache
+
+
+class SimulatedBeacon:
+    """
+    One beacon of the traffic mix: its identity (country code and 24 bits
+    of test protocol data), position, carrier offset from the receiver's
+    LO, power relative to unit amplitude and clock error.
+    """
+
+    def __init__(self, country_code, identity, position, cfo_hz, power_db=0.0, clock_ppm=0.0):
+        self.country_code = country_code
+        self.identity = identity
+        self.position = position
+        self.cfo_hz = cfo_hz
+        self.power_db = power_db
+        self.clock_ppm = clock_ppm
+
+        coords = gps()
+        coords.latitude, coords.longitude = position
+        self.packet = createPacket(coords, country_code, identity)
+
+
+def random_beacons(count, sample_rate=1e6, rx_lo=406025000, power_db=(-10.0, 10.0), cfo_error_hz=500.0,
+                   clock_ppm=20.0, max_offset_hz=None, seed=None):
+    """
+    count beacons with random identities and positions, each on a random
+    beacon channel inside the capture bandwidth, or within max_offset_hz
+    of the LO (off by up to cfo_error_hz), at a power drawn from the
+    power_db range.
+    """
+    rng = np.random.default_rng(seed)
+    limit = sample_rate / 2 - 2 * CHANNEL_SPACING
+    if max_offset_hz is not None:
+        limit = min(limit, max_offset_hz)
+    channels = [f - rx_lo for f in BEACON_CHANNELS_HZ if abs(f - rx_lo) < limit]
+    if not channels:
+        raise ValueError(f"No beacon channel within {sample_rate / 2:.0f} Hz of {rx_lo} Hz")
+
+    beacons = []
+    for _ in range(count):
+        beacons.append(SimulatedBeacon(
+            country_code=int(rng.integers(201, 776)),
+            identity=int(rng.integers(0, 1 << 24)),
+            position=(rng.uniform(-80, 80), rng.uniform(-180, 180)),
+            cfo_hz=rng.choice(channels) + rng.uniform(-cfo_error_hz, cfo_error_hz),
+            power_db=rng.uniform(*power_db),
+            clock_ppm=rng.uniform(-clock_ppm, clock_ppm),
+        ))
+    return beacons
+
+
+class BeaconTraffic(SyntheticSource):
+    """
+    SyntheticSource carrying many beacons at once. Bursts arrive at random
+    (a Poisson process of bursts_per_second), each from a random beacon
+    with that beacon's carrier offset, power and clock error, so at high
+    rates they overlap in time and share channels. Waveforms are rendered
+    once per beacon by a WaveformCache. sent holds (sample index, beacon)
+    for every burst put on the air.
+    """
+
+    def __init__(self, beacons, bursts_per_second=1.0, sample_rate=1e6, rx_lo=406025000, buffer_size=4096,
+                 snr_db=0.0, first_burst=0.5, data_rate=400, realtime=False, seed=None):
+        super().__init__(sample_rate, rx_lo, buffer_size, snr_db, interval=1.0 / bursts_per_second,
+                         first_burst=first_burst, data_rate=data_rate, realtime=realtime, seed=seed)
+        self.beacons = list(beacons)
+        self.cache = WaveformCache(data_rate=data_rate, samples_per_bit=self.samples_per_bit,
+                                   max_entries=len(self.beacons))
+        self.sent = []
+
+    def next_interval(self):
+        return self.rng.exponential(self.interval)
+
+    def send_beacon(self, at=None):
+        self._beacon = self.beacons[self.rng.integers(len(self.beacons))]
+        self._tx_at = self.position if at is None else at
+        self.cache.transmit(self, self._beacon.packet)
+        self.sent.append((self._tx_at, self._beacon))
+        self._tx_at = None
+        self.transmitted += 1
+
+    def tx(self, waveform):
+        beacon = self._beacon
+        self.clock_ppm = beacon.clock_ppm
+        super().tx(waveform)
+        at, waveform = self._on_air[-1]
+        t = (at + np.arange(len(waveform))) / self.sample_rate
+        gain = 10 ** (beacon.power_db / 20)
+        rotation = np.exp(1j * (2 * np.pi * beacon.cfo_hz * t + self.rng.uniform(0, 2 * np.pi)))
+        self._on_air[-1] = (at, (waveform * gain * rotation).astype(np.complex64))
+
+
+def write_traffic(path, traffic, seconds):
+    """
+    Records seconds of traffic.rx() to path as a cf32 recording.
+    """
+    total = int(seconds * traffic.sample_rate)
+    with IqRecorder(path, traffic.sample_rate, traffic.rx_lo, fmt="cf32") as recorder:
+        while recorder.metadata["num_samples"] < total:
+            recorder.write(traffic.rx()[:total - recorder.metadata["num_samples"]])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a multi-beacon recording and optionally decode it")
+    parser.add_argument("path")
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument("--beacons", type=int, default=20)
+    parser.add_argument("--rate", type=float, default=1.0, help="bursts per second")
+    parser.add_argument("--snr", type=float, default=0.0, help="dB per sample at 0 dB beacon power")
+    parser.add_argument("--sample-rate", type=float, default=1e6)
+    parser.add_argument("--max-offset", type=float, help="keep beacons within this many Hz of the LO")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--decode", action="store_true", help="decode the recording and score it")
+    args = parser.parse_args()
+
+    beacons = random_beacons(args.beacons, args.sample_rate, max_offset_hz=args.max_offset, seed=args.seed)
+    traffic = BeaconTraffic(beacons, args.rate, args.sample_rate, snr_db=args.snr, seed=args.seed)
+    write_traffic(args.path, traffic, args.seconds)
+
+    # Bursts still on the air at the end are cut short and not expected to decode
+    end = args.seconds - BURST_SECONDS - PREAMBLE_SECONDS
+    expected = [beacon for at, beacon in traffic.sent if at / args.sample_rate < end]
+    print(f"Wrote {args.seconds:.0f} s with {len(traffic.sent)} bursts from {len(beacons)} beacons to {args.path}")
+
+    if args.decode:
+        started = time.perf_counter()
+        decoded = [frame.value for _, frame, _ in decode_recording(args.path)]
+        elapsed = time.perf_counter() - started
+        values = {BeaconFrame.from_bits(beacon.packet).value for beacon in beacons}
+        correct = sum(value in values for value in decoded)
+        print(f"Decoded {correct} of {len(expected)} complete bursts ({len(decoded) - correct} false) in {elapsed:.1f} s "
+              f"({len(decoded) / elapsed:.1f} frames/s, {args.seconds / elapsed:.1f}x real time)")
@@ -0,0 +1,131 @@
+# ===========================================
+# Pre-Rendered Beacon Waveforms for the Test Transmitter
+# ===========================================
+
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+from beacon_frame import BeaconFrame
+from recording import IqRecorder, open_samples, to_complex
+from Test_Beacon import buildWaveform, createPacket, gps
+
+
+def packet_key(packet):
+    """
+    Hex string of a createPacket() bit list (36 digits for 144 bits).
+    """
+    return BeaconFrame.from_bits(packet).to_bytes().hex().upper()
+
+
+def quantize(waveform):
+    """
+    buildWaveform() output rounded to the int16 values sdr.tx() sends,
+    as complex64 (which holds them exactly).
+    """
+    iq = np.clip(np.rint(np.column_stack([waveform.real, waveform.imag])), -32768, 32767)
+    return iq.astype(np.float32).view(np.complex64)[:, 0]
+
+
+class WaveformCache:
+    """
+    Transmit buffers keyed by packet bits, rendered by buildWaveform()
+    once and then reused. The most recent max_entries buffers are kept in
+    memory; with a directory every buffer is also stored there as a ci16
+    recording (see recording.py), so a restart or another process reads
+    it back through a memory map instead of rendering it again.
+    """
+
+    def __init__(self, directory=None, data_rate=400, samples_per_bit=1700, max_entries=64):
+        self.directory = directory
+        self.data_rate = data_rate
+        self.samples_per_bit = samples_per_bit
+        self.sample_rate = data_rate * samples_per_bit
+        self.max_entries = max_entries
+        self.rendered = 0
+        self._buffers = OrderedDict()
+        # sdr.tx_cyclic_buffer as it was before a cyclic transmit(), until stop()
+        self._cyclic_was = None
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def path(self, packet):
+        return os.path.join(self.directory, f"{packet_key(packet)}_{self.sample_rate}.ci16")
+
+    def get(self, packet):
+        """
+        complex64 transmit buffer for packet (int16 sample values).
+        """
+        key = packet_key(packet)
+        buffer = self._buffers.get(key)
+        if buffer is not None:
+            self._buffers.move_to_end(key)
+            return buffer
+
+        path = self.path(packet) if self.directory is not None else None
+        if path is not None and os.path.exists(path):
+            buffer = to_complex(open_samples(path, "ci16"))
+        else:
+            buffer = quantize(buildWaveform(packet, self.data_rate, self.samples_per_bit))
+            self.rendered += 1
+            if path is not None:
+                # Written under a temporary name so readers never see a partial file
+                with IqRecorder(f"{path}.part", self.sample_rate) as recorder:
+                    recorder.write(buffer)
+                os.replace(f"{path}.part.json", f"{path}.json")
+                os.replace(f"{path}.part", path)
+
+        self._buffers[key] = buffer
+        if len(self._buffers) > self.max_entries:
+            self._buffers.popitem(last=False)
+        return buffer
+
+    def sweep(self, coordinates):
+        """
+        Renders (or loads) the beacon for every (latitude, longitude) pair,
+        e.g. a grid for load tests. Returns the packets in order.
+        """
+        packets = []
+        for latitude, longitude in coordinates:
+            position = gps()
+            position.latitude, position.longitude = latitude, longitude
+            packet = createPacket(position)
+            self.get(packet)
+            packets.append(packet)
+        return packets
+
+    def transmit(self, sdr, packet, period_seconds=None):
+        """
+        Pushes the cached buffer to sdr.tx(). With period_seconds the burst
+        is padded with silence to the period and sent as a Pluto cyclic
+        buffer, which the radio then repeats on its own with no further
+        calls; the Pluto's buffer memory limits this to a few seconds.
+        A one-shot transmit, or stop(), ends the repetition.
+        """
+        buffer = self.get(packet)
+        if period_seconds is None:
+            self.stop(sdr)
+            sdr.tx(buffer)
+            return
+        length = int(period_seconds * self.sample_rate)
+        if length < len(buffer):
+            raise ValueError(f"Period {period_seconds} s is shorter than the {len(buffer) / self.sample_rate:.3f} s burst")
+        cycle = np.zeros(length, dtype=np.complex64)
+        cycle[:len(buffer)] = buffer
+        sdr.tx_destroy_buffer()
+        if self._cyclic_was is None:
+            self._cyclic_was = bool(getattr(sdr, "tx_cyclic_buffer", False))
+        sdr.tx_cyclic_buffer = True
+        sdr.tx(cycle)
+
+    def stop(self, sdr):
+        """
+        Ends a cyclic transmit() and puts sdr.tx_cyclic_buffer back to its
+        previous value. Does nothing if none is running.
+        """
+        if self._cyclic_was is None:
+            return
+        sdr.tx_destroy_buffer()
+        sdr.tx_cyclic_buffer = self._cyclic_was
+        self._cyclic_was = None